@@ -0,0 +1,838 @@
+import os
+import json
+import difflib
+import logging
+import base64
+import contextlib
+import threading
+import subprocess
+from collections import OrderedDict, namedtuple
+from catherder import utils
+logger = logging.getLogger(__name__)
+
+
+CacheEntry = namedtuple('CacheEntry', ['path', 'sha'])
+# Local clones and pending Git Data API commits shared by all of the stores
+# in the process so that each repository is pushed/committed once per run
+# while writes are batched (see batch_writes)
+_clone_registry = {}
+_batch_registry = {}
+_registry_lock = threading.Lock()
+_batch_depth = 0
+
+
+class CacheStore(object):
+    r"""Snapshots stored in a directory of a Github repository. Snapshots
+    can be stored in full or, in 'delta' mode, as a full base snapshot
+    followed by deltas that record the differences between each snapshot
+    and the base so that any snapshot can be rebuilt from two files.
+
+    Args:
+        repo (github.Repository.Repository): Repository where the caches are
+            stored.
+        fname_format (str): Format string used to create cache file names
+            relative to the root of the repository.
+        storage (str, optional): How new snapshots should be stored, 'full'
+            or 'delta'. Defaults to 'full'.
+        base_interval (int, optional): Number of snapshots between full base
+            snapshots in 'delta' mode. Defaults to 20.
+
+    """
+
+    delta_ext = '.delta'
+
+    def __init__(self, repo, fname_format, storage='full', base_interval=20):
+        if storage not in ['full', 'delta']:
+            raise ValueError("Unsupported cache storage mode: '%s'"
+                             % storage)
+        self.repo = repo
+        self.fname_format = fname_format.replace(os.path.sep, '/')
+        self.storage = storage
+        self.base_interval = base_interval
+        self._base_contents = {}
+        self.batch = None
+        if repo is not None:
+            self.batch = get_batch(repo)
+
+    @property
+    def directory(self):
+        r"""str: Directory in the repository containing the caches."""
+        return os.path.dirname(self.fname_format)
+
+    @property
+    def ext(self):
+        r"""str: Extension of full snapshots."""
+        return os.path.splitext(self.fname_format)[-1]
+
+    def _list_files(self):
+        r"""List the files in the cache directory.
+
+        Returns:
+            list: CacheEntry for each file.
+
+        """
+        from github.GithubException import UnknownObjectException
+        try:
+            entries = [CacheEntry(x.path, x.sha)
+                       for x in self.repo.get_dir_contents(self.directory)]
+        except UnknownObjectException:
+            entries = []
+        return self.batch.apply(entries, self.directory)
+
+    def _read_file(self, path):
+        r"""Read the contents of a file in the repository.
+
+        Args:
+            path (str): Path to the file relative to the repository root.
+
+        Returns:
+            bytes: File contents.
+
+        """
+        contents = self.batch.get(path)
+        if contents is None:
+            contents = self.repo.get_contents(path).decoded_content
+        return contents
+
+    def _write_file(self, path, contents, message):
+        r"""Create a file in the repository. The file is staged and
+        committed along with every other change to the repository when the
+        store is flushed (see publish).
+
+        Args:
+            path (str): Path to the file relative to the repository root.
+            contents (bytes): File contents.
+            message (str): Commit message.
+
+        """
+        self.batch.write(path, contents, message, new=True)
+
+    def _update_file(self, entry, contents, message):
+        r"""Replace the contents of a file in the repository.
+
+        Args:
+            entry (CacheEntry): Entry for the file.
+            contents (bytes): New file contents.
+            message (str): Commit message.
+
+        """
+        self.batch.write(entry.path, contents, message)
+
+    def _delete_file(self, entry, message):
+        r"""Delete a file from the repository.
+
+        Args:
+            entry (CacheEntry): Entry for the file.
+            message (str): Commit message.
+
+        """
+        self.batch.delete(entry.path, message)
+
+    def read_file(self, path):
+        r"""Read the contents of a file in the repository that may be outside
+        the cache directory (e.g. the contacts file).
+
+        Args:
+            path (str): Path to the file relative to the repository root.
+
+        Returns:
+            bytes: File contents.
+
+        """
+        return self._read_file(path.replace(os.path.sep, '/'))
+
+    def flush(self):
+        r"""Commit the changes staged for the repository."""
+        if self.batch is not None:
+            self.batch.flush()
+
+    def publish(self):
+        r"""Flush the store unless writes are being batched, in which case
+        the changes are published when batching ends."""
+        if not is_batching():
+            self.flush()
+
+    @classmethod
+    def is_delta(cls, path):
+        r"""Determine if a cache file contains a delta.
+
+        Args:
+            path (str): Path to the cache file.
+
+        Returns:
+            bool: True if the file contains a delta.
+
+        """
+        return path.endswith(cls.delta_ext)
+
+    def list_entries(self):
+        r"""List the caches in the repository from oldest to newest.
+
+        Returns:
+            list: CacheEntry for each cache.
+
+        """
+        return sorted(self._list_files(), key=lambda x: x.path)
+
+    def latest_entry(self):
+        r"""Get the entry for the most recent cache.
+
+        Returns:
+            CacheEntry: Entry for the most recent cache, None if there are
+                not any caches.
+
+        """
+        entries = self.list_entries()
+        if entries:
+            return entries[-1]
+        return None
+
+    def read(self, entry):
+        r"""Read the contents of a snapshot, rebuilding it from its base if
+        it is stored as a delta.
+
+        Args:
+            entry (CacheEntry, str): Entry or path for the cache.
+
+        Returns:
+            bytes: Snapshot contents.
+
+        """
+        path = getattr(entry, 'path', entry)
+        if not self.is_delta(path):
+            return self._read_file(path)
+        delta = json.loads(self._read_file(path).decode('utf-8'),
+                           object_pairs_hook=OrderedDict)
+        if delta['base'] not in self._base_contents:
+            # Only the most recently used base is kept
+            self._base_contents = {delta['base']:
+                                   self._read_file(delta['base'])}
+        return apply_delta(self._base_contents[delta['base']], delta,
+                           self.ext)
+
+    def write(self, path, contents, message):
+        r"""Store a new snapshot. In 'delta' mode, the snapshot is stored as a
+        delta against the most recent base snapshot unless a new base is due
+        or the delta would not be smaller than the snapshot.
+
+        Args:
+            path (str): Path to the snapshot relative to the repository root.
+            contents (bytes): Snapshot contents.
+            message (str): Commit message.
+
+        Returns:
+            CacheEntry: Entry for the file that was created.
+
+        """
+        path = path.replace(os.path.sep, '/')
+        if self.storage == 'delta':
+            base, count = self.current_base()
+            if (base is not None) and (count + 1 < self.base_interval):
+                delta = self.make_delta(base, contents)
+                if delta is not None:
+                    path += self.delta_ext
+                    contents = delta
+        self._write_file(path, contents, message)
+        self.publish()
+        return CacheEntry(path, utils.git_blob_sha(contents))
+
+    def current_base(self, entries=None):
+        r"""Locate the most recent base snapshot.
+
+        Args:
+            entries (list, optional): Entries for the caches from oldest to
+                newest. Defaults to the result of list_entries.
+
+        Returns:
+            tuple: The most recent base snapshot (None if there is not one)
+                and the number of snapshots stored since the base.
+
+        """
+        if entries is None:
+            entries = self.list_entries()
+        count = 0
+        for x in reversed(entries):
+            if not self.is_delta(x.path):
+                return x, count
+            count += 1
+        return None, count
+
+    def make_delta(self, base, contents):
+        r"""Create a delta that rebuilds a snapshot from a base snapshot.
+
+        Args:
+            base (CacheEntry, str): Entry or path for the base snapshot.
+            contents (bytes): Snapshot contents.
+
+        Returns:
+            bytes: Encoded delta, None if the delta does not rebuild the
+                snapshot exactly or would not be smaller than the snapshot.
+
+        """
+        path = getattr(base, 'path', base)
+        if path not in self._base_contents:
+            self._base_contents = {path: self._read_file(path)}
+        base_contents = self._base_contents[path]
+        delta = make_delta(base_contents, contents, self.ext)
+        delta['base'] = path
+        if apply_delta(base_contents, delta, self.ext) != contents:
+            return None
+        out = json.dumps(delta).encode('utf-8')
+        if len(out) >= len(contents):
+            return None
+        return out
+
+    def compact(self, message="Compacting cache history"):
+        r"""Repack the cache history into base snapshots every base_interval
+        snapshots with deltas against the base in between. Every snapshot
+        can still be rebuilt after compaction.
+
+        Args:
+            message (str, optional): Commit message. Defaults to
+                'Compacting cache history'.
+
+        Returns:
+            int: Number of files replaced or rewritten.
+
+        """
+        entries = self.list_entries()
+        base = None
+        count = 0
+        replaced = []
+        nrewritten = 0
+        # New files are written before any are removed so that deltas can
+        # always be rebuilt from their original base
+        for x in entries:
+            snapshot_path = x.path
+            if self.is_delta(x.path):
+                snapshot_path = x.path[:-len(self.delta_ext)]
+            if (base is None) or (count + 1 >= self.base_interval):
+                if self.is_delta(x.path):
+                    self._write_file(snapshot_path, self.read(x), message)
+                    replaced.append(x)
+                base = snapshot_path
+                count = 0
+                continue
+            count += 1
+            contents = self.read(x)
+            if self.is_delta(x.path):
+                delta = json.loads(self._read_file(x.path).decode('utf-8'))
+                if delta['base'] == base:
+                    continue
+            delta = self.make_delta(base, contents)
+            if delta is None:
+                if self.is_delta(x.path):
+                    self._write_file(snapshot_path, contents, message)
+                    replaced.append(x)
+            elif self.is_delta(x.path):
+                self._update_file(x, delta, message)
+                nrewritten += 1
+            else:
+                self._write_file(snapshot_path + self.delta_ext, delta,
+                                 message)
+                replaced.append(x)
+        for x in replaced:
+            self._delete_file(x, message)
+        self.publish()
+        nchanged = len(replaced) + nrewritten
+        logger.info("Replaced %d files in %s" % (nchanged, self.directory))
+        return nchanged
+
+
+class GitDataBatch(object):
+    r"""Changes to a Github repository that are committed together in a
+    single commit via the Git Data API. Staged files are visible to reads
+    through the stores that share the batch before they are committed.
+
+    Args:
+        repo (github.Repository.Repository): Repository that changes should
+            be committed to.
+
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.lock = threading.RLock()
+        self.messages = []
+        self._files = OrderedDict()
+        self._new = set()
+
+    def __len__(self):
+        return len(self._files)
+
+    def get(self, path):
+        r"""Get the staged contents of a file.
+
+        Args:
+            path (str): Path to the file relative to the repository root.
+
+        Returns:
+            bytes: Staged contents, None if the file is not staged or is
+                staged for deletion.
+
+        """
+        with self.lock:
+            return self._files.get(path, None)
+
+    def apply(self, entries, directory):
+        r"""Apply staged changes to a directory listing.
+
+        Args:
+            entries (list): CacheEntry for each file in the directory on the
+                remote.
+            directory (str): Directory relative to the repository root.
+
+        Returns:
+            list: CacheEntry for each file in the directory after the staged
+                changes are applied.
+
+        """
+        with self.lock:
+            out = [x for x in entries if x.path not in self._files]
+            for k, v in self._files.items():
+                if (v is not None) and (os.path.dirname(k) == directory):
+                    out.append(CacheEntry(k, utils.git_blob_sha(v)))
+        return out
+
+    def write(self, path, contents, message, new=False):
+        r"""Stage a new version of a file.
+
+        Args:
+            path (str): Path to the file relative to the repository root.
+            contents (bytes): File contents.
+            message (str): Message describing the change.
+            new (bool, optional): If True, the file does not exist in the
+                repository yet. Defaults to False.
+
+        """
+        with self.lock:
+            if new:
+                self._new.add(path)
+            self._files[path] = contents
+            self.add_message(message)
+
+    def delete(self, path, message):
+        r"""Stage the deletion of a file.
+
+        Args:
+            path (str): Path to the file relative to the repository root.
+            message (str): Message describing the change.
+
+        """
+        with self.lock:
+            if path in self._new:
+                # Files created during this run never reach the repository
+                self._new.remove(path)
+                del self._files[path]
+            else:
+                self._files[path] = None
+            self.add_message(message)
+
+    def add_message(self, message):
+        if message not in self.messages:
+            self.messages.append(message)
+
+    def flush(self):
+        r"""Commit the staged changes as a single commit on the default
+        branch. If the branch moves while the commit is created, the commit
+        is recreated on top of the new head once.
+
+        Returns:
+            str: SHA of the new commit, None if nothing was staged.
+
+        """
+        from github import InputGitTreeElement
+        from github.GithubException import GithubException
+        with self.lock:
+            if not self._files:
+                return None
+            elements = []
+            for k, v in self._files.items():
+                if v is None:
+                    elements.append(InputGitTreeElement(k, '100644', 'blob',
+                                                        sha=None))
+                else:
+                    elements.append(InputGitTreeElement(
+                        k, '100644', 'blob', content=v.decode('utf-8')))
+            if len(self.messages) == 1:
+                message = self.messages[0]
+            else:
+                message = 'Updating caches\n\n' + '\n'.join(
+                    ['- %s' % x for x in self.messages])
+            ref = self.repo.get_git_ref('heads/%s' % self.repo.default_branch)
+            for i in range(2):
+                parent = self.repo.get_git_commit(ref.object.sha)
+                tree = self.repo.create_git_tree(elements, parent.tree)
+                commit = self.repo.create_git_commit(message, tree, [parent])
+                try:
+                    ref.edit(commit.sha)
+                    break
+                except GithubException:
+                    if i > 0:
+                        raise
+                    ref = self.repo.get_git_ref(
+                        'heads/%s' % self.repo.default_branch)
+            logger.info("Committed %d cache files to %s in %s"
+                        % (len(elements), self.repo.full_name, commit.sha))
+            self._files = OrderedDict()
+            self._new = set()
+            self.messages = []
+            return commit.sha
+
+
+def get_batch(repo):
+    r"""Get the batch of pending changes for a repository, creating it if one
+    has not been created yet during this run.
+
+    Args:
+        repo (github.Repository.Repository): Repository.
+
+    Returns:
+        GitDataBatch: Pending changes to the repository.
+
+    """
+    with _registry_lock:
+        if repo.full_name not in _batch_registry:
+            _batch_registry[repo.full_name] = GitDataBatch(repo)
+        return _batch_registry[repo.full_name]
+
+
+class LocalClone(object):
+    r"""Local clone of a git repository that is synchronized with the
+    remote the first time it is used during a run and pushed once when
+    flushed.
+
+    Args:
+        url (str): URL (or path) of the remote repository.
+        directory (str): Directory where the clone should be kept.
+        token (str, optional): Github token used to authenticate with the
+            remote. The token is passed to each call through the
+            environment so that it is not visible in the process list or
+            stored in the clone's configuration. Defaults to None.
+
+    """
+
+    def __init__(self, url, directory, token=None):
+        self.url = url
+        self.directory = directory
+        self.token = token
+        self.lock = threading.RLock()
+        self._synced = False
+        self._unpushed = False
+        self._identity = None
+
+    def git(self, *args, **kwargs):
+        r"""Call git in the clone.
+
+        Args:
+            *args: Arguments passed to git.
+            cwd (str, optional): Directory that git should be called from.
+                Defaults to the clone directory.
+
+        Returns:
+            str: Output from git.
+
+        Raises:
+            RuntimeError: If the git command fails.
+
+        """
+        cwd = kwargs.get('cwd', self.directory)
+        cmd = ['git'] + list(args)
+        env = None
+        if self.token:
+            # Config from the environment (git >= 2.31) is added after any
+            # entries that are already set
+            env = dict(os.environ)
+            count = int(env.get('GIT_CONFIG_COUNT', '0') or '0')
+            auth = base64.b64encode(
+                ('x-access-token:%s' % self.token).encode('utf-8'))
+            env['GIT_CONFIG_KEY_%d' % count] = 'http.extraheader'
+            env['GIT_CONFIG_VALUE_%d' % count] = (
+                'AUTHORIZATION: basic %s' % auth.decode('utf-8'))
+            env['GIT_CONFIG_COUNT'] = str(count + 1)
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError("git %s failed in %s: %s"
+                               % (args[0], cwd, err.decode('utf-8')))
+        return out.decode('utf-8')
+
+    @property
+    def remote_branch(self):
+        r"""str: Default branch on the remote (e.g. 'origin/main'), None if
+        the remote does not have any commits."""
+        try:
+            return self.git('rev-parse', '--abbrev-ref',
+                            'origin/HEAD').strip()
+        except RuntimeError:
+            return None
+
+    @property
+    def identity(self):
+        r"""list: Arguments supplying a committer identity to git if the user
+        has not configured one."""
+        if self._identity is None:
+            try:
+                self.git('config', 'user.email')
+                self._identity = []
+            except RuntimeError:
+                self._identity = ['-c', 'user.name=catherder',
+                                  '-c', 'user.email=catherder@localhost']
+        return self._identity
+
+    def sync(self):
+        r"""Clone the repository or fetch and rebase local commits onto the
+        remote. This only happens once per run."""
+        with self.lock:
+            if self._synced:
+                return
+            if not os.path.isdir(os.path.join(self.directory, '.git')):
+                logger.info("Cloning %s into %s" % (self.url, self.directory))
+                self.git('clone', '--quiet', self.url, self.directory,
+                         cwd=None)
+            else:
+                self.git('fetch', '--quiet', 'origin')
+                self.rebase()
+            self._synced = True
+
+    def rebase(self):
+        r"""Fast-forward the clone to the remote, replaying any commits that
+        have not been pushed yet."""
+        branch = self.remote_branch
+        if branch is None:
+            # The clone was made while the remote was empty
+            try:
+                self.git('remote', 'set-head', 'origin', '--auto')
+            except RuntimeError:
+                return
+            branch = self.remote_branch
+            if branch is None:
+                return
+        self.git(*(self.identity + ['rebase', '--quiet', branch]))
+        if self.git('rev-list', '%s..HEAD' % branch).strip():
+            self._unpushed = True
+
+    def commit(self, paths, message, remove=False):
+        r"""Commit changes to files in the clone.
+
+        Args:
+            paths (list): Paths to the files relative to the repository root.
+            message (str): Commit message.
+            remove (bool, optional): If True, the files are removed. Defaults
+                to False.
+
+        """
+        with self.lock:
+            if remove:
+                self.git('rm', '--quiet', '--', *paths)
+            else:
+                self.git('add', '--', *paths)
+            self.git(*(self.identity + ['commit', '--quiet', '-m', message]))
+            self._unpushed = True
+
+    def flush(self):
+        r"""Push local commits to the remote. If the remote changed since it
+        was fetched, the local commits are rebased and the push is tried
+        again once."""
+        with self.lock:
+            if not self._unpushed:
+                return
+            try:
+                self.git('push', '--quiet', 'origin', 'HEAD')
+            except RuntimeError:
+                self.git('fetch', '--quiet', 'origin')
+                self.rebase()
+                self.git('push', '--quiet', 'origin', 'HEAD')
+            self._unpushed = False
+            logger.info("Pushed cache updates from %s" % self.directory)
+
+
+def get_clone(url, directory, token=None):
+    r"""Get the local clone kept in a directory, creating it if one has not
+    been created yet during this run.
+
+    Args:
+        url (str): URL (or path) of the remote repository.
+        directory (str): Directory where the clone should be kept.
+        token (str, optional): Github token used to authenticate with the
+            remote. Defaults to None.
+
+    Returns:
+        LocalClone: Clone kept in the directory.
+
+    """
+    directory = os.path.abspath(directory)
+    with _registry_lock:
+        if directory not in _clone_registry:
+            _clone_registry[directory] = LocalClone(url, directory,
+                                                    token=token)
+        return _clone_registry[directory]
+
+
+def flush_all():
+    r"""Commit the changes staged for each repository and push the commits
+    made to each local clone during this run."""
+    with _registry_lock:
+        pending = (list(_batch_registry.values())
+                   + list(_clone_registry.values()))
+    for x in pending:
+        x.flush()
+
+
+def is_batching():
+    r"""bool: True if cache writes are being batched."""
+    return _batch_depth > 0
+
+
+@contextlib.contextmanager
+def batch_writes():
+    r"""Context in which cache writes are staged (or committed to local
+    clones without being pushed) and then published together by flush_all
+    when the outermost context exits. Outside of this context, each write
+    is published immediately."""
+    global _batch_depth
+    with _registry_lock:
+        _batch_depth += 1
+    try:
+        yield
+    finally:
+        with _registry_lock:
+            _batch_depth -= 1
+            outermost = (_batch_depth == 0)
+        if outermost:
+            flush_all()
+
+
+class LocalCloneCacheStore(CacheStore):
+    r"""Snapshots stored in a local clone of the cache repository. Reads
+    and writes happen on disk and changes are published when the clone is
+    flushed.
+
+    Args:
+        clone (LocalClone): Clone of the repository where the caches are
+            stored.
+        fname_format (str): Format string used to create cache file names
+            relative to the root of the repository.
+        **kwargs: Additional keyword arguments are passed to CacheStore.
+
+    """
+
+    def __init__(self, clone, fname_format, **kwargs):
+        super(LocalCloneCacheStore, self).__init__(None, fname_format,
+                                                   **kwargs)
+        self.clone = clone
+
+    def _local_path(self, path):
+        self.clone.sync()
+        return os.path.join(self.clone.directory, *path.split('/'))
+
+    def _list_files(self):
+        self.clone.sync()
+        try:
+            out = self.clone.git('ls-tree', 'HEAD', '--',
+                                 self.directory + '/')
+        except RuntimeError:
+            # The repository does not have any commits
+            return []
+        entries = []
+        for line in out.splitlines():
+            info, path = line.split('\t', 1)
+            entries.append(CacheEntry(path, info.split()[2]))
+        return entries
+
+    def _read_file(self, path):
+        with open(self._local_path(path), 'rb') as fd:
+            return fd.read()
+
+    def _write_file(self, path, contents, message):
+        local_path = self._local_path(path)
+        if not os.path.isdir(os.path.dirname(local_path)):
+            os.makedirs(os.path.dirname(local_path))
+        with open(local_path, 'wb') as fd:
+            fd.write(contents)
+        self.clone.commit([path], message)
+
+    def _update_file(self, entry, contents, message):
+        self._write_file(entry.path, contents, message)
+
+    def _delete_file(self, entry, message):
+        self._local_path(entry.path)
+        self.clone.commit([entry.path], message, remove=True)
+
+    def flush(self):
+        r"""Push commits made to the clone to the remote repository."""
+        self.clone.flush()
+
+
+def _split_snapshot(contents, ext):
+    # Split a snapshot into sequences of hashable entries
+    if ext == '.json':
+        data = json.loads(contents.decode('utf-8'),
+                          object_pairs_hook=OrderedDict)
+        if isinstance(data, dict) and all([isinstance(v, list)
+                                           for v in data.values()]):
+            return OrderedDict([(k, [json.dumps(x) for x in v])
+                                for k, v in data.items()])
+    return OrderedDict([('', contents.decode('utf-8').splitlines(True))])
+
+
+def _join_snapshot(sequences, ext):
+    # Join sequences produced by _split_snapshot into a snapshot
+    if list(sequences.keys()) == ['']:
+        return ''.join(sequences['']).encode('utf-8')
+    return json.dumps(OrderedDict([
+        (k, [json.loads(x, object_pairs_hook=OrderedDict) for x in v])
+        for k, v in sequences.items()])).encode('utf-8')
+
+
+def make_delta(base, contents, ext):
+    r"""Create a delta recording the changes between two snapshots. JSON
+    snapshots containing lists are compared entry by entry and other
+    snapshots are compared line by line.
+
+    Args:
+        base (bytes): Contents of the base snapshot.
+        contents (bytes): Contents of the new snapshot.
+        ext (str): File extension of the snapshots.
+
+    Returns:
+        dict: Delta containing the replacements that should be made to each
+            sequence in the base to produce the new snapshot.
+
+    """
+    seq_base = _split_snapshot(base, ext)
+    seq_new = _split_snapshot(contents, ext)
+    ops = OrderedDict()
+    for k, v in seq_new.items():
+        v_base = seq_base.get(k, [])
+        matcher = difflib.SequenceMatcher(None, v_base, v, autojunk=False)
+        ops[k] = [[i1, i2, v[j1:j2]] for tag, i1, i2, j1, j2
+                  in matcher.get_opcodes() if tag != 'equal']
+    return OrderedDict([('keys', list(seq_new.keys())), ('ops', ops)])
+
+
+def apply_delta(base, delta, ext):
+    r"""Rebuild a snapshot from a base snapshot and a delta.
+
+    Args:
+        base (bytes): Contents of the base snapshot.
+        delta (dict): Delta created by make_delta.
+        ext (str): File extension of the snapshots.
+
+    Returns:
+        bytes: Contents of the rebuilt snapshot.
+
+    """
+    seq_base = _split_snapshot(base, ext)
+    out = OrderedDict()
+    for k in delta['keys']:
+        v_base = seq_base.get(k, [])
+        v = []
+        pos = 0
+        for i1, i2, new in delta['ops'][k]:
+            v += v_base[pos:i1] + new
+            pos = i2
+        out[k] = v + v_base[pos:]
+    return _join_snapshot(out, ext)
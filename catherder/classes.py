@@ -1,20 +1,26 @@
+import io
 import os
 import re
 import csv
 import copy
 import json
+import functools
+import time
 import datetime
-import shutil
 import pprint
 import logging
 import tempfile
+import threading
 from collections import OrderedDict
-import smartsheet
-import github
-from github import Github, Consts
-from catherder import names, utils, config
+from concurrent.futures import ThreadPoolExecutor
+from catherder import (names, utils, config, cache, ratelimit, httpcache,
+                       directory)
 input = config.input
 logger = logging.getLogger(__name__)
+# Clients and resolved objects that are shared by all API instances in the
+# process so that connections are reused across projects
+_client_registry = {}
+_registry_lock = threading.Lock()
 
 
 _old_github_issue_format = None
@@ -42,17 +48,58 @@ _github_issue_format = """\
 {existing_info}
 
 """
+# Fields requested for Github issues and pull requests by the GraphQL
+# fetcher. Project cards are included so that the column of every issue is
+# retrieved without walking the cards in each project column.
+_github_graphql_issue_fields = """
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          number createdAt title body state
+          milestone { title }
+          assignees(first: 100) { nodes { login } }
+          projectCards(first: 20, archivedStates: [ARCHIVED, NOT_ARCHIVED]) {
+            nodes { project { name } column { name } }
+          }
+        }"""
+_github_graphql_queries = {
+    'issues': """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    items: issues(first: 100, after: $cursor,
+                  orderBy: {field: CREATED_AT, direction: DESC}) {%s
+    }
+  }
+}""" % _github_graphql_issue_fields,
+    'pullRequests': """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    items: pullRequests(first: 100, after: $cursor,
+                        orderBy: {field: CREATED_AT, direction: DESC}) {%s
+    }
+  }
+}""" % _github_graphql_issue_fields,
+    'milestones': """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    items: milestones(first: 100, after: $cursor, states: [OPEN, CLOSED],
+                      orderBy: {field: DUE_DATE, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { title description state dueOn }
+    }
+  }
+}"""}
 
 
 class UpdateAPI(object):
 
     name = None
+    rate_limit_defaults = {}
     cache_file_format = None
     remote_address_default = None
     dependent_on_remote_data = []
 
     def __init__(self, project_name=None, remote_address=None, token=None,
-                 cache_repo=None, always_yes=False):
+                 cache_repo=None, always_yes=False, lazy=False):
         self.project_name = project_name
         self.config = config.read_project_config(project_name=project_name)
         if self.project_name is None:
@@ -60,9 +107,19 @@ class UpdateAPI(object):
         self.logger = logger
         self.remote_address = remote_address
         self.token = token
-        self.cache_repo = cache_repo
         self.always_yes = always_yes
-        self.local_data = None
+        self._cache_repo = cache_repo
+        self._cache = None
+        self._names = None
+        self._api = None
+        self._remote_data = None
+        self._local_data = None
+        self._snapshot = None
+        self._latest = None
+        self._cache_contents = None
+        self._state_version = 0
+        self._synced_version = None
+        self._synced_time = None
         if self.remote_address is None:
             self.remote_address = self.remote_address_default
         if self.token is None:
@@ -70,34 +127,110 @@ class UpdateAPI(object):
         if not self.token:
             self.token = os.environ.get(
                 self.config[self.name]['token_env_var'], None)
-        if self.cache_repo is None:
-            github_token = self.config['github']['token']
-            if not github_token:
-                github_token = None
-            self.cache_repo = GithubAPI.get_api(github_token).get_repo(
-                self.config['github']['repository'])
-        contacts = self.config['general']['contacts_file']
-        if not os.path.isfile(contacts):
-            ext = os.path.splitext(contacts)[-1]
-            contents = self.cache_repo.get_contents(contacts).decoded_content
-            contacts = tempfile.NamedTemporaryFile(suffix=ext, mode='r+')
-            contacts.write(contents.decode('utf-8-sig'))
-            contacts.seek(0)
-        try:
-            self.names = names.Names(contacts)
-        finally:
-            if not isinstance(contacts, config.str_types):
-                contacts.close()
-        if not os.path.isdir(self.project_dir):
-            os.mkdir(self.project_dir)
+        # The APIs for a project may be created concurrently
         cache_dir = os.path.join(self.project_dir,
                                  self.config[self.name]['cache_dir'])
-        if not os.path.isdir(cache_dir):
-            os.mkdir(cache_dir)
-        self.api = self.get_api(token=self.token)
-        self._remote_data = None
+        os.makedirs(cache_dir, exist_ok=True)
+        self.prepare_remote()
+        if not lazy:
+            self.initialize()
+
+    def prepare_remote(self):
+        r"""Prepare for requests to the remote. This is called once the
+        config has been read and before any remote data is loaded."""
+        pass
+
+    def initialize(self):
+        r"""Build each of the stages that are otherwise initialized on
+        demand (contacts, cache repository, API client, remote data and local
+        data)."""
+        for k in ['names', 'cache', 'api']:
+            getattr(self, k)
         self.update_state()
 
+    @property
+    def cache_repo(self):
+        r"""github.Repository.Repository: Github repository where caches are
+        stored."""
+        if self._cache_repo is None:
+            github_token = self.config['github']['token']
+            if not github_token:
+                github_token = None
+            self._cache_repo = GithubAPI.get_repository(
+                self.config['github']['repository'], token=github_token)
+        return self._cache_repo
+
+    @property
+    def cache(self):
+        r"""cache.CacheStore: Snapshots stored in the cache repository."""
+        if self._cache is None:
+            kws = dict(
+                storage=self.config.get('general', 'cache_storage',
+                                        fallback='full'),
+                base_interval=self.config.getint(
+                    'general', 'cache_base_interval', fallback=20))
+            backend = self.config.get('general', 'cache_backend',
+                                      fallback='api')
+            if backend == 'clone':
+                url = self.config.get('general', 'cache_clone_url',
+                                      fallback=None)
+                if not url:
+                    url = 'https://github.com/%s.git' % (
+                        self.config['github']['repository'])
+                github_token = self.config['github']['token']
+                if not github_token:
+                    github_token = os.environ.get(
+                        self.config['github']['token_env_var'], None)
+                clone = cache.get_clone(
+                    url, os.path.join(self.project_dir, 'cache_repo'),
+                    token=github_token)
+                self._cache = cache.LocalCloneCacheStore(
+                    clone, self.cache_file_format, **kws)
+            elif backend == 'api':
+                self._cache = cache.CacheStore(
+                    self.cache_repo, self.cache_file_format, **kws)
+            else:
+                raise ValueError("Unsupported cache backend: '%s'" % backend)
+        return self._cache
+
+    @property
+    def names(self):
+        r"""names.Names: Contacts used to convert between names, e-mails and
+        Github usernames."""
+        if self._names is None:
+            contacts = self.config['general']['contacts_file']
+            if not os.path.isfile(contacts):
+                ext = os.path.splitext(contacts)[-1]
+                contents = self.cache.read_file(contacts)
+                contacts = tempfile.NamedTemporaryFile(suffix=ext, mode='r+')
+                contacts.write(contents.decode('utf-8-sig'))
+                contacts.seek(0)
+            try:
+                self._names = names.Names(contacts)
+            finally:
+                if not isinstance(contacts, config.str_types):
+                    contacts.close()
+        return self._names
+
+    @property
+    def api(self):
+        r"""object: Top level API object."""
+        if self._api is None:
+            self._api = self.get_api(token=self.token)
+        return self._api
+
+    @property
+    def local_data(self):
+        r"""dict: Data from the most recent cache. If a cache has not been
+        loaded yet, the cache is first updated from the remote."""
+        if self._local_data is None:
+            self.update_state()
+        return self._local_data
+
+    @local_data.setter
+    def local_data(self, value):
+        self._local_data = value
+
     @property
     def project_dir(self):
         r"""str: Directory used to store cache entries for the project."""
@@ -116,6 +249,84 @@ class UpdateAPI(object):
             self._remote_data = self.load_remote(self.remote_address)
         return self._remote_data
 
+    @property
+    def snapshot_index_file(self):
+        r"""str: Path to the file containing data from the last snapshot
+        that is used to perform incremental snapshots."""
+        return os.path.join(self.project_dir,
+                            '%s_snapshot_index.json' % self.name)
+
+    def load_snapshot_index(self, now=None):
+        r"""Load the data from the last snapshot if incremental snapshots
+        are enabled and a full resync is not due.
+
+        Args:
+            now (datetime.datetime, optional): Current time used to check
+                if a full resync is due. Defaults to utcnow.
+
+        Returns:
+            dict: Data from the last snapshot, None if a full snapshot should
+                be taken.
+
+        """
+        if not self.config.getboolean(self.name, 'incremental_snapshot',
+                                      fallback=False):
+            return None
+        if now is None:
+            now = datetime.datetime.utcnow()
+        index = utils.load_json(self.snapshot_index_file)
+        if (index is None) or (index.get('address') != self.remote_address):
+            return None
+        time_format = self.config['general']['time_format']
+        last_full = datetime.datetime.strptime(index['last_full'],
+                                               time_format)
+        max_age = datetime.timedelta(days=self.config.getfloat(
+            self.name, 'full_resync_days', fallback=7))
+        if (now - last_full) > max_age:
+            return None
+        return index
+
+    @property
+    def resolved_ids_file(self):
+        r"""str: Path to the file where IDs resolved from names are
+        stored."""
+        return os.path.join(self.project_dir, '%s_ids.json' % self.name)
+
+    def get_cached_id(self, kind, name):
+        r"""Get the ID previously resolved for a named object.
+
+        Args:
+            kind (str): Type of object (e.g. 'sheet').
+            name (str): Name of the object.
+
+        Returns:
+            int: ID of the object, None if it has not been resolved.
+
+        """
+        ids = utils.load_json(self.resolved_ids_file, default={})
+        return ids.get(kind, {}).get(name, None)
+
+    def set_cached_ids(self, kind, ids, replace=False):
+        r"""Store IDs resolved from the names of objects.
+
+        Args:
+            kind (str): Type of object (e.g. 'sheet').
+            ids (dict): Mapping from object names to IDs. Names with an ID
+                of None are removed.
+            replace (bool, optional): If True, any existing IDs for this kind
+                of object are removed. Defaults to False.
+
+        """
+        all_ids = utils.load_json(self.resolved_ids_file, default={})
+        if replace or (kind not in all_ids):
+            all_ids[kind] = {}
+        for k, v in ids.items():
+            if v is None:
+                all_ids[kind].pop(k, None)
+            else:
+                all_ids[kind][k] = v
+        utils.dump_json(self.resolved_ids_file, all_ids)
+
     def return_remote_property(self, prop_name):
         r"""Return property that is dependent on remote."""
         pass
@@ -127,7 +338,74 @@ class UpdateAPI(object):
 
     @classmethod
     def get_api(cls, token=None):
-        r"""Return the top level API object."""
+        r"""Return the top level API object. Objects are shared between all
+        API instances using the same service and token so that connections
+        to the service are reused.
+
+        Args:
+            token (str, optional): Authentication token.
+
+        Returns:
+            object: Top level API object.
+
+        """
+        if not token:
+            token = None
+        return cls.get_registered((cls.name, token), cls.create_api,
+                                  token=token)
+
+    @classmethod
+    def get_registered(cls, key, func, *args, **kwargs):
+        r"""Get an object from the process wide registry, creating it if it
+        does not already exist.
+
+        Args:
+            key (tuple): Key identifying the object.
+            func (function): Function that should be called to create the
+                object if it is not in the registry.
+            *args: Additional arguments are passed to func.
+            **kwargs: Additional keyword arguments are passed to func.
+
+        Returns:
+            object: Registered object.
+
+        """
+        with _registry_lock:
+            if key in _client_registry:
+                return _client_registry[key]
+        out = func(*args, **kwargs)
+        with _registry_lock:
+            return _client_registry.setdefault(key, out)
+
+    @classmethod
+    def get_rate_limiter(cls, token=None, resource=None):
+        r"""Get the limiter tracking the request budget for a token. The
+        limiter is shared by all API instances using the same service and
+        token.
+
+        Args:
+            token (str, optional): Authentication token.
+            resource (str, optional): Name of the rate limit resource for
+                services that keep separate budgets. Defaults to None.
+
+        Returns:
+            ratelimit.RateLimiter: Rate limiter.
+
+        """
+        if not token:
+            token = None
+        return ratelimit.get_limiter(cls.name, token, resource=resource,
+                                     **cls.rate_limit_defaults)
+
+    @property
+    def rate_limiter(self):
+        r"""ratelimit.RateLimiter: Limiter tracking the request budget for
+        the API's token."""
+        return self.get_rate_limiter(token=self.token)
+
+    @classmethod
+    def create_api(cls, token=None):
+        r"""Create a new top level API object."""
         pass
 
     @classmethod
@@ -201,7 +479,7 @@ class UpdateAPI(object):
                 get_updated_from_other and upload_remote.
 
         """
-        self.update_state()
+        self.ensure_state()
         old = self.local_data
         new = self.get_updated_from_other(other, **kwargs)
         diff = utils.get_diff(old, new)
@@ -210,7 +488,11 @@ class UpdateAPI(object):
             if self.always_yes or (input('y/[n]?: ').lower() in ['y', 'yes']):
                 if new is not None:
                     self.upload_remote(new, **kwargs)
-                self.update_state()
+                    self._state_version += 1
+                # Incremental snapshots only fetch the entries changed since
+                # the last snapshot so this verifies the uploaded changes
+                # without downloading the full remote again
+                self.ensure_state()
         else:
             self.logger.info("No updates necessary.")
 
@@ -234,28 +516,80 @@ class UpdateAPI(object):
         prev = copy.deepcopy(self.local_data)
         return func(prev, other, **kwargs)
 
-    def update_state(self, now=None):
-        r"""Update the state record in the cache repository.
+    @property
+    def state_is_current(self):
+        r"""bool: True if the local data was synchronized with the remote
+        after the last upload made by this instance and the synchronization
+        is more recent than the 'state_max_age' option (in seconds)."""
+        if (self._synced_version is None) or (self._snapshot is not None):
+            return False
+        if self._synced_version != self._state_version:
+            return False
+        max_age = self.config.getfloat('general', 'state_max_age',
+                                       fallback=300)
+        return (time.time() - self._synced_time) <= max_age
+
+    def ensure_state(self):
+        r"""Update the state record if the local data is not current."""
+        if self.state_is_current:
+            logger.debug("Reusing %s state from %.1f s ago"
+                         % (self.name, time.time() - self._synced_time))
+        else:
+            self.update_state()
+
+    def take_snapshot(self, now=None):
+        r"""Download the current remote data to a new local cache file and
+        locate the most recent cache in the cache repository. The snapshot
+        is used by the next call to update_state. This does not require
+        any user input so it can be run for multiple APIs concurrently.
 
         Args:
             now (datetime.Datetime, optional): Timestamp that should be used
                in the name for the new file.
 
+        Returns:
+            tuple: The entry for the most recent cache (or None if one does
+                not exist) and the path to the new cache file relative to
+                the project directory.
+
         """
         if now is None:
             now = datetime.datetime.utcnow()
-        fname_old = utils.find_most_recent(self.cache_file_format,
-                                           repo=self.cache_repo)
+        entry_old = self.cache.latest_entry()
         fname_new = now.strftime(self.cache_file_format)
         fname_new_local = os.path.join(self.project_dir, fname_new)
         self.download_remote(fname_new_local)
-        if fname_old is None:
+        self._snapshot = (entry_old, fname_new)
+        return self._snapshot
+
+    def update_state(self, now=None):
+        r"""Update the state record in the cache repository.
+
+        Args:
+            now (datetime.Datetime, optional): Timestamp that should be used
+               in the name for the new file. Ignored if a snapshot was
+               already taken by take_snapshot.
+
+        """
+        if self._snapshot is None:
+            self.take_snapshot(now=now)
+        entry_old, fname_new = self._snapshot
+        self._snapshot = None
+        fname_new_local = os.path.join(self.project_dir, fname_new)
+        if entry_old is None:
             self.commit_state(fname_new,
                               "Creating initial %s cache" % self.name,
                               '%s cache does not exist. Should one be created?'
                               % self.name)
+        elif (self.get_cache_hash(entry_old)
+              == utils.content_hash(fname_new_local)):
+            logger.info("%s cache remains the same." % self.name)
+            self.remember_latest(entry_old.path, fname_new_local)
         else:
-            diff = utils.get_diff(fname_old, fname_new_local)
+            diff = utils.get_diff(
+                utils.load_snapshot(self.read_cache(entry_old),
+                                    self.cache.ext),
+                fname_new_local)
             if diff:
                 self.commit_state(fname_new,
                                   "Updating %s cache" % self.name,
@@ -264,9 +598,70 @@ class UpdateAPI(object):
                                   % (self.name, diff))
             else:
                 logger.info("%s cache remains the same." % self.name)
-        if os.path.isfile(fname_new_local) and (self.cache_repo is not None):
+                self.remember_latest(entry_old.path, fname_new_local)
+        if os.path.isfile(fname_new_local):
             os.remove(fname_new_local)
         self.local_data = self.load_most_recent()
+        self._synced_version = self._state_version
+        self._synced_time = time.time()
+
+    @property
+    def cache_hash_file(self):
+        r"""str: Path to the file where hashes of the contents of caches in
+        the cache repository are stored."""
+        return os.path.join(self.project_dir,
+                            '%s_cache_hashes.json' % self.name)
+
+    def read_cache(self, entry):
+        r"""Read a cache from the cache repository. The contents of the last
+        cache read are kept so that hashing, diffing and loading the same
+        cache only downloads (and, in delta mode, rebuilds) it once.
+
+        Args:
+            entry (cache.CacheEntry): Entry for a cache in the repository.
+
+        Returns:
+            bytes: Contents of the cache.
+
+        """
+        if ((self._cache_contents is None)
+                or (self._cache_contents[0] != entry)):
+            self._cache_contents = (entry, self.cache.read(entry))
+        return self._cache_contents[1]
+
+    def get_cache_hash(self, entry):
+        r"""Get the content hash for a cache. Hashes for caches in the cache
+        repository are stored so that the cache only needs to be downloaded
+        the first time its hash is requested.
+
+        Args:
+            entry (cache.CacheEntry): Entry for a cache in the repository.
+
+        Returns:
+            str: Content hash (see utils.content_hash).
+
+        """
+        hashes = utils.load_json(self.cache_hash_file, default={})
+        if hashes.get(entry.path, {}).get('sha', None) == entry.sha:
+            return hashes[entry.path]['hash']
+        out = utils.content_hash(self.read_cache(entry),
+                                 fname_format=self.cache_file_format)
+        self.set_cache_hash(entry.path, entry.sha, out)
+        return out
+
+    def set_cache_hash(self, path, sha, content_hash):
+        r"""Store the content hash for the most recent cache in the cache
+        repository. Only the most recent cache is compared against so hashes
+        for older caches are discarded.
+
+        Args:
+            path (str): Path to the cache in the repository.
+            sha (str): Git blob SHA of the cache.
+            content_hash (str): Content hash of the cache.
+
+        """
+        utils.dump_json(self.cache_hash_file,
+                        {path: {'sha': sha, 'hash': content_hash}})
 
     def commit_state(self, new_cache, message, question=None):
         r"""Commit the specified file to the cache repository using the
@@ -284,12 +679,30 @@ class UpdateAPI(object):
         print(question)
         if self.always_yes or (input('y/[n]?: ').lower() in ['y', 'yes']):
             with open(new_cache_local, 'rb') as fd:
-                self.cache_repo.create_file(new_cache.replace(
-                    os.path.sep, '/'), message, fd.read())
+                contents = fd.read()
+            entry = self.cache.write(new_cache, contents, message)
+            self.set_cache_hash(entry.path, entry.sha,
+                                utils.content_hash(
+                                    contents,
+                                    fname_format=self.cache_file_format))
+            self.remember_latest(entry.path, new_cache_local)
         os.remove(new_cache_local)
 
+    def remember_latest(self, path, fname):
+        r"""Keep the data from a local file that matches the most recent
+        cache in memory so that it does not have to be downloaded again by
+        load_most_recent.
+
+        Args:
+            path (str): Path to the cache in the cache repository.
+            fname (str): Local file with the same contents as the cache.
+
+        """
+        self._latest = (path, self.load_local(fname))
+
     def load_most_recent(self, default=False):
-        r"""Get the remote data for the specified address.
+        r"""Get the data from the most recent cache. The cache is only
+        downloaded if it is newer than the cache held in memory.
 
         Args:
             default (object, optional): API object that should be returned if
@@ -302,14 +715,18 @@ class UpdateAPI(object):
             ValueError: If the object cannot be located.
 
         """
-        fd = utils.find_most_recent(self.cache_file_format,
-                                    repo=self.cache_repo,
-                                    return_tempfile=True)
-        try:
-            out = self.load_local(fd, default=default)
-        finally:
-            if fd is not None:
-                fd.close()
+        entry = self.cache.latest_entry()
+        if entry is None:
+            if default is not False:
+                return default
+            raise ValueError("There are not any %s caches in the cache "
+                             "repository." % self.name)
+        if (self._latest is not None) and (self._latest[0] == entry.path):
+            return self._latest[1]
+        fd = io.StringIO(self.read_cache(entry).decode('utf-8-sig'),
+                         newline='')
+        out = self.load_local(fd, default=default)
+        self._latest = (entry.path, out)
         return out
 
     @classmethod
@@ -381,8 +798,19 @@ class GithubAPI(UpdateAPI):
         self._issue2card = None
         self._issue2column = None
         self._column_id2name = None
+        self._project_map_lock = threading.Lock()
         super(GithubAPI, self).__init__(*args, **kwargs)
 
+    def prepare_remote(self):
+        r"""Allow reads to be spread across the tokens in the 'read_tokens'
+        option before any remote data is loaded."""
+        read_tokens = self.config.get('github', 'read_tokens', fallback='')
+        if read_tokens.strip():
+            write_token = self.token or os.environ.get("GITHUB_TOKEN", None)
+            ratelimit.add_read_tokens(
+                self.name, write_token,
+                [x.strip() for x in read_tokens.replace(',', ' ').split()])
+
     @property
     def remote_address_default(self):
         r"""str: The address associated with the remote project data."""
@@ -399,37 +827,43 @@ class GithubAPI(UpdateAPI):
     def github_project(self):
         r"""github.Project.Project: Github project."""
         if self._github_project is None:
-            self._github_project = self.get_entry(
-                self.remote_data.get_projects(), 'name',
-                self.github_project_name, by_attr=True)
+            from github.GithubException import UnknownObjectException
+            project_id = self.get_cached_id('project',
+                                            self.github_project_name)
+            if project_id is not None:
+                try:
+                    out = self.api.get_project(project_id)
+                    if out.name == self.github_project_name:
+                        self._github_project = out
+                except UnknownObjectException:
+                    pass
+            if self._github_project is None:
+                self._github_project = self.get_entry(
+                    self.remote_data.get_projects(), 'name',
+                    self.github_project_name, by_attr=True)
+                self.set_cached_ids('project', {
+                    self.github_project_name: self._github_project.id})
         return self._github_project
 
     @property
     def issue2card(self):
         r"""dict: Mapping from Github issue number to project card."""
         if self._issue2card is None:
-            self._issue2card = {}
-            for col in self.github_project_map.values():
-                self._issue2card.update(col['issue2card'])
+            self.load_project_map()
         return self._issue2card
 
     @property
     def issue2column(self):
         r"""dict: Mapping from Github issue number to project column."""
         if self._issue2column is None:
-            self._issue2column = {}
-            for col in self.github_project_map.values():
-                for k in col['issue2card'].keys():
-                    self._issue2column[k] = col['column']
+            self.load_project_map()
         return self._issue2column
 
     @property
     def column_id2name(self):
         r"""dict: Mapping from project column name to ID."""
         if self._column_id2name is None:
-            self._column_id2name = {}
-            for k, v in self.github_project_map.items():
-                self._column_id2name[v['column'].id] = k
+            self.load_project_map()
         return self._column_id2name
 
     @property
@@ -437,39 +871,125 @@ class GithubAPI(UpdateAPI):
         r"""dict: Mapping from column name to dictionaries describing
         each column."""
         if self._github_project_map is None:
-            self._github_project_map = OrderedDict([])
-            for x in self.github_project.get_columns():
-                self._github_project_map[x.name] = OrderedDict([
-                    ('column', x),
-                    ('cards', OrderedDict()),
-                    ('issue2card', OrderedDict())])
-                for card in x.get_cards(archived_state='all'):
-                    issue_url = card.content_url
-                    issue_num = None
-                    if issue_url:
-                        issue_num = int(issue_url.split('/')[-1])
-                        self._github_project_map[x.name]['issue2card'][
-                            issue_num] = card
-                    self._github_project_map[x.name]['cards'][card.id] = {
-                        'issue': issue_num,
-                        'card': card}
+            self.load_project_map()
         return self._github_project_map
 
+    def load_project_map(self):
+        r"""Load the cards in each column of the project and build the
+        mappings between columns, cards and issues in a single pass. The
+        cards in each column are listed concurrently by up to
+        'column_threads' threads, but columns are kept in board order."""
+        columns = list(self.github_project.get_columns())
+        nthreads = max(1, min(len(columns), self.config.getint(
+            'github', 'column_threads', fallback=4)))
+        with ThreadPoolExecutor(max_workers=nthreads) as executor:
+            column_cards = list(executor.map(utils.keep_log_project(
+                lambda x: list(x.get_cards(archived_state='all'))), columns))
+        project_map = OrderedDict([])
+        issue2card = {}
+        issue2column = {}
+        column_id2name = {}
+        for x, cards in zip(columns, column_cards):
+            project_map[x.name] = OrderedDict([
+                ('column', x),
+                ('cards', OrderedDict()),
+                ('issue2card', OrderedDict())])
+            column_id2name[x.id] = x.name
+            for card in cards:
+                issue_url = card.content_url
+                issue_num = None
+                if issue_url:
+                    issue_num = int(issue_url.split('/')[-1])
+                    project_map[x.name]['issue2card'][issue_num] = card
+                    issue2card[issue_num] = card
+                    issue2column[issue_num] = x
+                project_map[x.name]['cards'][card.id] = {
+                    'issue': issue_num,
+                    'card': card}
+        self._github_project_map = project_map
+        self._issue2card = issue2card
+        self._issue2column = issue2column
+        self._column_id2name = column_id2name
+        self.set_cached_ids('columns', OrderedDict([
+            (k, v['column'].id) for k, v in project_map.items()]),
+            replace=True)
+
+    def get_column(self, column_name):
+        r"""Get a project column by name. If the column ID was resolved
+        previously, the column is retrieved directly instead of listing the
+        columns and cards in the project.
+
+        Args:
+            column_name (str): Name of the column.
+
+        Returns:
+            github.ProjectColumn.ProjectColumn: Project column.
+
+        """
+        from github.GithubException import UnknownObjectException
+        column_id = self.get_cached_id('columns', column_name)
+        if (self._github_project_map is None) and (column_id is not None):
+            try:
+                out = self.api.get_project_column(column_id)
+                if out.name == column_name:
+                    return out
+            except UnknownObjectException:
+                pass
+        return self.github_project_map[column_name]['column']
+
     @classmethod
     def get_api(cls, token=None):
         r"""Return the top level API object."""
-        if token is not None:
-            g = Github(token)
-        else:
+        if not token:
+            token = os.environ.get("GITHUB_TOKEN", None)
+        return super(GithubAPI, cls).get_api(token=token)
+
+    @classmethod
+    def get_rate_limiter(cls, token=None, resource='core'):
+        r"""Get the limiter tracking the request budget for a token. REST
+        requests are charged to the 'core' resource by default."""
+        if not token:
+            token = os.environ.get("GITHUB_TOKEN", None)
+        return super(GithubAPI, cls).get_rate_limiter(token=token,
+                                                      resource=resource)
+
+    @classmethod
+    def get_repository(cls, address, token=None):
+        r"""Return a Github repository, reusing the object if the repository
+        was already resolved with the same token.
+
+        Args:
+            address (str): Name of the repository in the form
+                <user/organization>/<repo>.
+            token (str, optional): Authentication token.
+
+        Returns:
+            github.Repository.Repository: Github repository.
+
+        """
+        api = cls.get_api(token=token)
+        return cls.get_registered(('repository', id(api), address),
+                                  api.get_repo, address)
+
+    @classmethod
+    def create_api(cls, token=None):
+        r"""Create a new top level API object."""
+        from github import Github
+        if token is None:
             # Try to read the GITHUB_TOKEN env var
             try:
-                g = Github(os.environ["GITHUB_TOKEN"])
+                token = os.environ["GITHUB_TOKEN"]
             except KeyError:
                 logger.error(
                     "Please provide a GitHub auth token using the config file "
                     "or the GITHUB_TOKEN env var"
                     )
                 raise
+        g = Github(token)
+        # The HTTP cache is wrapped first so that it sees the token each
+        # request is actually sent with
+        httpcache.wrap_github(g._Github__requester)
+        ratelimit.wrap_github(g._Github__requester, token)
         return g
 
     @classmethod
@@ -485,10 +1005,14 @@ class GithubAPI(UpdateAPI):
 
     def load_remote(self, address, default=False):
         r"""Get the remote data for the specified address."""
-        return self.api.get_repo(address)
+        return self.get_repository(address, token=self.token)
 
     def remote2local(self, remote_data):
-        r"""Convert remote version of data to local dictionary.
+        r"""Convert remote version of data to local dictionary. If possible,
+        only issues updated since the last snapshot are retrieved and merged
+        into the issues from that snapshot. If the 'graphql' option is set,
+        issues, milestones and card columns are retrieved in bulk using
+        GraphQL instead.
 
         Args:
             remote_data (object): Remote data API object.
@@ -497,14 +1021,232 @@ class GithubAPI(UpdateAPI):
             dict: Local version of data.
 
         """
-        milestones = []
-        for m in remote_data.get_milestones(state='all'):
-            milestones.append(self.remote2local_milestone(m))
+        time_format = self.config['general']['time_format']
+        now = datetime.datetime.utcnow()
+        index = self.load_snapshot_index(now=now)
+        use_graphql = self.config.getboolean('github', 'graphql',
+                                             fallback=False)
+        if use_graphql:
+            # The columns of every issue are needed and are returned with
+            # the issues so every GraphQL snapshot is a full snapshot
+            self.logger.debug("Taking full snapshot of Github issues using "
+                              "GraphQL")
+            milestones = [self.graphql2local_milestone(m) for m in
+                          self.graphql_paginate('milestones')]
+            index = {'address': self.remote_address,
+                     'last_full': now.strftime(time_format),
+                     'issues': self.graphql_issues()}
+            columns = {x['number']: x['data']['column']
+                       for x in index['issues']
+                       if x['data']['column'] is not None}
+        else:
+            # Milestones cannot be filtered or sorted by the time they were
+            # updated, but there are few enough to list every time
+            milestones = []
+            for m in remote_data.get_milestones(state='all'):
+                milestones.append(self.remote2local_milestone(m))
+            if index is not None:
+                # Overlap with the previous snapshot to allow for clock skew
+                since = (datetime.datetime.strptime(index['timestamp'],
+                                                    time_format)
+                         - datetime.timedelta(minutes=10))
+                self.logger.debug("Fetching Github issues updated since %s"
+                                  % since)
+                issues = OrderedDict([(x['number'], x)
+                                      for x in index['issues']])
+                for i in remote_data.get_issues(state='all', since=since):
+                    issues[i.number] = self.remote2index_issue(i)
+                # Deleted and transferred issues are not returned as updated
+                # so they can only be detected by the number of issues
+                total = remote_data.get_issues(state='all').totalCount
+                if len(issues) == total:
+                    index['issues'] = self.sort_index_issues(issues.values())
+                else:
+                    self.logger.info(("Github has %d issues, but the merged "
+                                      "snapshot has %d. Taking a full "
+                                      "snapshot.") % (total, len(issues)))
+                    index = None
+            if index is None:
+                self.logger.debug("Taking full snapshot of Github issues")
+                index = {'address': self.remote_address,
+                         'last_full': now.strftime(time_format),
+                         'issues': self.sort_index_issues(
+                             [self.remote2index_issue(i) for i in
+                              remote_data.get_issues(state='all')])}
+            # Moving a card does not change the time the issue was updated
+            # so the column is always taken from the current project board
+            columns = {k: v.name for k, v in self.issue2column.items()}
+        index['timestamp'] = now.strftime(time_format)
         issues = []
-        for i in remote_data.get_issues(state='all'):
-            issues.append(self.remote2local_issue(i))
+        for x in index['issues']:
+            if x['number'] not in columns:
+                raise ValueError("Could not locate card for issue %d."
+                                 % x['number'])
+            x['data']['column'] = columns[x['number']]
+            issues.append(copy.deepcopy(x['data']))
+        utils.dump_json(self.snapshot_index_file, index)
         return {'milestones': milestones, 'issues': issues}
 
+    def graphql(self, query, variables=None):
+        r"""Run a GraphQL query against the Github API.
+
+        Args:
+            query (str): GraphQL query.
+            variables (dict, optional): Variables for the query. Defaults to
+                None.
+
+        Returns:
+            dict: Data returned by the query.
+
+        Raises:
+            ValueError: If the query returns errors.
+
+        """
+        input = {'query': query}
+        if variables:
+            input['variables'] = variables
+        headers, data = self.remote_data._requester.requestJsonAndCheck(
+            'POST', '/graphql', input=input)
+        if data.get('errors', None):
+            raise ValueError("Github GraphQL query failed: %s" % '; '.join(
+                [x.get('message', str(x)) for x in data['errors']]))
+        return data['data']
+
+    def graphql_paginate(self, name):
+        r"""Iterate over the nodes returned by one of the GraphQL queries for
+        the repository, requesting each page of 100 nodes as it is needed.
+
+        Args:
+            name (str): Name of the query in _github_graphql_queries.
+
+        Yields:
+            dict: Nodes returned by the query.
+
+        """
+        owner, repo = self.remote_address.split('/', 1)
+        variables = {'owner': owner, 'name': repo, 'cursor': None}
+        while True:
+            page = self.graphql(_github_graphql_queries[name],
+                                variables)['repository']['items']
+            for x in page['nodes']:
+                yield x
+            if not page['pageInfo']['hasNextPage']:
+                return
+            variables['cursor'] = page['pageInfo']['endCursor']
+
+    def graphql_issues(self):
+        r"""Get snapshot index entries for Github issues and pull requests
+        (which are included with issues by the REST API) using GraphQL.
+
+        Returns:
+            list: Snapshot index entries sorted by creation time (newest
+                first).
+
+        """
+        out = []
+        for name in ['issues', 'pullRequests']:
+            out += [self.graphql2index_issue(x, self.github_project_name)
+                    for x in self.graphql_paginate(name)]
+        return self.sort_index_issues(out)
+
+    @classmethod
+    def sort_index_issues(cls, issues):
+        r"""Sort snapshot index entries so that full and incremental
+        snapshots list issues in the same order.
+
+        Args:
+            issues (list): Snapshot index entries.
+
+        Returns:
+            list: Entries sorted by creation time and number (newest first).
+
+        """
+        return sorted(issues, key=lambda x: (x['created_at'], x['number']),
+                      reverse=True)
+
+    @classmethod
+    def graphql2column(cls, node, project_name):
+        r"""Get the name of the project column containing the card for an
+        issue returned by a GraphQL query.
+
+        Args:
+            node (dict): Issue or pull request node.
+            project_name (str): Name of the Github project.
+
+        Returns:
+            str: Name of the column, None if the issue does not have a card in
+                a column of the project.
+
+        """
+        for card in node['projectCards']['nodes']:
+            if (((card['project'] or {}).get('name', None) == project_name)
+                    and card['column']):
+                return card['column']['name']
+        return None
+
+    @classmethod
+    def graphql2index_issue(cls, node, project_name):
+        r"""Convert an issue or pull request returned by a GraphQL query into
+        a snapshot index entry matching the output of remote2index_issue.
+
+        Args:
+            node (dict): Issue or pull request node.
+            project_name (str): Name of the Github project.
+
+        Returns:
+            dict: Issue number, creation time and the dictionary of data from
+                the Github issue.
+
+        """
+        data = {'title': node['title'],
+                'body': node['body'].replace('\r\n', '\n'),
+                'milestone': None,
+                'assignees': [x['login'] for x in
+                              node['assignees']['nodes']],
+                # Merged pull requests are closed in the REST API
+                'state': ('closed' if node['state'] == 'MERGED'
+                          else node['state'].lower()),
+                'column': cls.graphql2column(node, project_name)}
+        if node['milestone']:
+            data['milestone'] = node['milestone']['title']
+        return {'number': node['number'],
+                'created_at': node['createdAt'][:19],
+                'data': data}
+
+    @classmethod
+    def graphql2local_milestone(cls, node):
+        r"""Convert a milestone returned by a GraphQL query into a dictionary
+        matching the output of remote2local_milestone.
+
+        Args:
+            node (dict): Milestone node.
+
+        Returns:
+            dict: Dictionary of data from the Github milestone.
+
+        """
+        due_on = datetime.datetime.strptime(node['dueOn'][:19],
+                                            '%Y-%m-%dT%H:%M:%S')
+        return {'title': node['title'],
+                'description': node['description'],
+                'state': node['state'].lower(),
+                'due_on': due_on.strftime("%m/%d/%y")}
+
+    def remote2index_issue(self, issue):
+        r"""Convert Github issue object into a snapshot index entry.
+
+        Args:
+            issue (github.Issue.Issue): Issue object to be converted.
+
+        Returns:
+            dict: Issue number, creation time and the dictionary of data from
+                the Github issue.
+
+        """
+        return {'number': issue.number,
+                'created_at': issue.created_at.strftime('%Y-%m-%dT%H:%M:%S'),
+                'data': self.remote2local_issue(issue)}
+
     def remote2local_milestone(self, milestone):
         r"""Convert Github milestone object into a dictionary.
 
@@ -561,14 +1303,43 @@ class GithubAPI(UpdateAPI):
                 automation card for moving editted issues into the
                 'In progress' column will be suspended. Defaults to True.
 
+        Returns:
+            list: For each change that was made, the type of object, title,
+                action, outcome ('ok' or 'failed') and error message.
+
         """
         map_milestones = {x.title: x for x in
                           self.remote_data.get_milestones(state='all')}
         map_issues = {x.title: x for x in
                       self.remote_data.get_issues(state='all')}
-        # Suspend automation card
-        if suspend_progress_automation:
-            self.suspend_card('In progress')
+        # Changes are confirmed up front and then made concurrently, with
+        # milestones created before the issues that reference them
+        milestone_tasks = []
+        issue_tasks = []
+
+        def edit_milestone(x_obj, x):
+            x_obj.edit(**x)
+
+        def create_milestone(x):
+            map_milestones[x['title']] = self.remote_data.create_milestone(
+                **x)
+
+        def edit_issue(x_obj, x, x_column, edit):
+            x['milestone'] = map_milestones[x['milestone']]
+            if edit:
+                x_obj.edit(**x)
+            # Move card for issue into the correct column after the edit
+            new_column = self.github_project_map[x_column]['column']
+            card, old_column = self.get_card(
+                issue=x_obj, return_column_and_card=True)
+            if old_column.id != new_column.id:
+                self.edit_card(card, column_id=new_column.id,
+                               position="bottom")
+
+        def create_issue(x):
+            x['milestone'] = map_milestones[x['milestone']]
+            self.remote_data.create_issue(**x)
+
         # Update milestones
         for x_orig in data['milestones']:
             # Create a copy with adjustments for actually calling
@@ -585,20 +1356,23 @@ class GithubAPI(UpdateAPI):
                            "updated? The diff is \n%s\n") % (x['title'], diff))
                     if self.always_yes or (input('y/[n]?: ').lower()
                                            in ['y', 'yes']):
-                        x_obj.edit(**x)
+                        milestone_tasks.append(
+                            (('milestone', x['title'], 'edit'),
+                             functools.partial(edit_milestone, x_obj, x)))
             # Create a new milestone after confirming with the user
             else:
                 print('Create new milestone?\n%s\n' % pprint.pformat(x))
                 if self.always_yes or (input('y/[n]?: ').lower()
                                        in ['y', 'yes']):
-                    x_obj = self.remote_data.create_milestone(**x)
+                    milestone_tasks.append(
+                        (('milestone', x['title'], 'create'),
+                         functools.partial(create_milestone, x)))
         # Update issues
         for x_orig in data['issues']:
             # Create a copy with adjustments for actually calling
             x = copy.deepcopy(x_orig)
             if x['milestone'] is None:
                 continue
-            x['milestone'] = map_milestones[x['milestone']]
             # Check to see if the issue already exists
             if x['title'] in map_issues:
                 x_obj = map_issues[x['title']]
@@ -610,26 +1384,42 @@ class GithubAPI(UpdateAPI):
                     x_column = x.pop('column', None)
                     print(("Issue '%s' already exists. Should it be updated? "
                            "The diff is \n%s\n") % (x['title'], diff))
-                    if self.always_yes or (input('y/[n]?: ').lower()
-                                           in ['y', 'yes']):
-                        x_obj.edit(**x)
-                    # Move card for issue into the correct column
-                    new_column = self.github_project_map[x_column]['column']
-                    card, old_column = self.get_card(
-                        issue=x_obj, return_column_and_card=True)
-                    if old_column.id != new_column.id:
-                        self.edit_card(card, column_id=new_column.id,
-                                       position="bottom")
+                    edit = (self.always_yes
+                            or (input('y/[n]?: ').lower() in ['y', 'yes']))
+                    issue_tasks.append(
+                        (('issue', x['title'], 'edit' if edit else 'move'),
+                         functools.partial(edit_issue, x_obj, x, x_column,
+                                           edit)))
             # Create a new issue after confirming with the user
             else:
                 x.pop('state')
                 print('Create new issue?\n%s\n' % pprint.pformat(x))
                 if self.always_yes or (input('y/[n]?: ').lower()
                                        in ['y', 'yes']):
-                    return self.remote_data.create_issue(**x)
-        # Restore automation card
+                    x.pop('column', None)
+                    issue_tasks.append(
+                        (('issue', x['title'], 'create'),
+                         functools.partial(create_issue, x)))
+        if not (milestone_tasks or issue_tasks):
+            return []
+        # Each issue requires an edit and may require a card move
+        self.rate_limiter.check_budget(
+            len(milestone_tasks) + 2 * len(issue_tasks), 'Github upload')
+        nthreads = self.config.getint('github', 'upload_threads',
+                                      fallback=4)
+        # Suspend automation card
         if suspend_progress_automation:
-            self.restore_card('In progress')
+            self.suspend_card('In progress')
+        try:
+            results = utils.run_tasks(milestone_tasks, max_workers=nthreads)
+            results += utils.run_tasks(issue_tasks, max_workers=nthreads)
+        finally:
+            # Restore automation card
+            if suspend_progress_automation:
+                self.restore_card('In progress')
+        self.logger.info("Github updates:\n%s" % utils.format_table(
+            results, ['type', 'title', 'action', 'outcome', 'error']))
+        return results
 
     @classmethod
     def get_milestone_from_Smartsheet_objective(cls, objective):
@@ -768,26 +1558,42 @@ class GithubAPI(UpdateAPI):
                 y_gh.update(x_gh)
         return prev
 
-    def sort_cards(self, column_name=None):
+    def sort_cards(self, column_name=None, minimal=True, titles=None):
         r"""Sort cards alphabetically and into appropriate columns,
         putting automation cards at the bottom.
 
         Args:
             column_name (str, optional): Name of the column that should be
                 sorted. None causes all columns to be sorted. Defaults to None.
+            minimal (bool, optional): If True, issue titles are taken from
+                the last snapshot where possible, cards in the longest run
+                that is already in order are left in place, and columns that
+                are already sorted are not changed. If False, every card is
+                moved. Defaults to True.
+            titles (dict, optional): Mapping from issue number to title.
+                Defaults to None and titles are loaded from the last snapshot
+                index if minimal is True.
+
+        Returns:
+            int: Number of cards that were moved.
 
         """
+        from github.ProjectColumn import ProjectColumn
         regex_obj = '([0-9]+)([A-Z]+)([0-9]+):'
+        if minimal and (titles is None):
+            index = utils.load_json(self.snapshot_index_file, default={})
+            titles = {x['number']: x['data']['title']
+                      for x in index.get('issues', [])}
         if column_name is None:
             column_name = list(self.github_project_map.keys())
         if isinstance(column_name, list):
-            for column in column_name:
-                self.sort_cards(column)
-            return
-        elif isinstance(column_name, github.ProjectColumn.ProjectColumn):
+            return sum([self.sort_cards(column, minimal=minimal,
+                                        titles=titles)
+                        for column in column_name])
+        elif isinstance(column_name, ProjectColumn):
             column = column_name
         else:
-            column = self.github_project_map[column_name]['column']
+            column = self.get_column(column_name)
         keymap = ('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
                   'abcdefghijklmnopqrstuvwxyz')
 
@@ -797,18 +1603,62 @@ class GithubAPI(UpdateAPI):
                     return 'zzzz' + card.note
                 return '0000' + card.note
             else:
-                issue_name = card.get_content().title
+                issue_name = None
+                if titles and card.content_url:
+                    issue_name = titles.get(
+                        int(card.content_url.split('/')[-1]), None)
+                if issue_name is None:
+                    issue_name = card.get_content().title
                 matches = re.findall(regex_obj, issue_name)
                 if matches:
                     return ''.join([keymap[int(matches[0][0])], matches[0][1],
                                     keymap[int(matches[0][2])]])
                 return '0000' + issue_name
 
-        cards = sorted(list(column.get_cards()), key=sort_cards)
-        self.edit_card(cards[0], position='top')
-        for i in range(1, len(cards)):
-            self.edit_card(cards[i], position=('after:%s'
-                                               % cards[i - 1].id))
+        if not minimal:
+            cards = sorted(list(column.get_cards()), key=sort_cards)
+            self.edit_card(cards[0], position='top')
+            for i in range(1, len(cards)):
+                self.edit_card(cards[i], position=('after:%s'
+                                                   % cards[i - 1].id))
+            return len(cards)
+        if self._github_project_map is not None:
+            cards = [x['card'] for x in
+                     self.github_project_map[column.name]['cards'].values()
+                     if not x['card'].archived]
+        else:
+            cards = list(column.get_cards())
+        keys = [sort_cards(x) for x in cards]
+        order = sorted(range(len(cards)), key=lambda i: keys[i])
+        rank = {i: r for r, i in enumerate(order)}
+        keep = utils.longest_increasing_subsequence(
+            [rank[i] for i in range(len(cards))])
+        if len(keep) == len(cards):
+            self.logger.debug("Cards in column '%s' are already sorted"
+                              % column.name)
+            return 0
+        self.rate_limiter.check_budget(len(cards) - len(keep),
+                                       "sort of column '%s'" % column.name)
+        # Cards are moved in the sorted order so the card before each moved
+        # card is already in its final position
+        keep = set(keep)
+        nmoved = 0
+        for r, i in enumerate(order):
+            if r in keep:
+                continue
+            if r == 0:
+                self.edit_card(cards[i], position='top')
+            else:
+                self.edit_card(cards[i], position=('after:%s'
+                                                   % cards[order[r - 1]].id))
+            nmoved += 1
+        self.logger.info("Moved %d of %d cards in column '%s'"
+                         % (nmoved, len(cards), column.name))
+        if self._github_project_map is not None:
+            entries = self.github_project_map[column.name]['cards']
+            for i in order:
+                entries.move_to_end(cards[i].id)
+        return nmoved
 
     def get_card(self, columns=None, card_prefix=None, issue=None,
                  return_column=False, return_column_and_card=False,
@@ -842,6 +1692,7 @@ class GithubAPI(UpdateAPI):
             ValueError: If the card cannot be located and default is False.
 
         """
+        from github.ProjectColumn import ProjectColumn
         if issue:
             if issue.number in self.issue2card:
                 if return_column_and_card:
@@ -869,7 +1720,7 @@ class GithubAPI(UpdateAPI):
             for c in columns:
                 if isinstance(c, config.str_types):
                     column = self.github_project_map[c]
-                elif isinstance(c, github.ProjectColumn.ProjectColumn):
+                elif isinstance(c, ProjectColumn):
                     column = self.github_project_map[c.name]
                 else:  # pragma: debug
                     raise TypeError("Unsupported column type: '%s'" % type(c))
@@ -899,6 +1750,7 @@ class GithubAPI(UpdateAPI):
             column_id (str, optional): New value for column_id.
 
         """
+        from github import Consts
         # Call to PATCH
         post_parameters = dict()
         if note is not None:
@@ -929,19 +1781,22 @@ class GithubAPI(UpdateAPI):
                 input=post_parameters)
             card._useAttributes(data)
             if column_id and (column_id != old_column_id):
-                old_column = self.column_id2name[old_column_id]
-                new_column = self.column_id2name[column_id]
-                self.github_project_map[new_column]['cards'][card.id] = (
-                    self.github_project_map[old_column]['cards'].pop(card.id))
-                issue = self.github_project_map[new_column]['cards'][
-                    card.id]['issue']
-                if issue is not None:
-                    self.github_project_map[new_column][
-                        'issue2card'][issue] = (
-                            self.github_project_map[old_column][
-                                'issue2card'].pop(issue))
-                    self.issue2column[issue] = self.github_project_map[
-                        new_column]['column']
+                # Cards may be moved by concurrent uploads
+                with self._project_map_lock:
+                    old_column = self.column_id2name[old_column_id]
+                    new_column = self.column_id2name[column_id]
+                    self.github_project_map[new_column]['cards'][card.id] = (
+                        self.github_project_map[old_column]['cards'].pop(
+                            card.id))
+                    issue = self.github_project_map[new_column]['cards'][
+                        card.id]['issue']
+                    if issue is not None:
+                        self.github_project_map[new_column][
+                            'issue2card'][issue] = (
+                                self.github_project_map[old_column][
+                                    'issue2card'].pop(issue))
+                        self.issue2column[issue] = self.github_project_map[
+                            new_column]['column']
 
     def suspend_card(self, column_name, card_prefix='###### Automation Rules'):
         r"""Suspend automation card.
@@ -977,9 +1832,13 @@ class GithubAPI(UpdateAPI):
 class SmartsheetAPI(UpdateAPI):
 
     name = 'smartsheet'
+    # Smartsheet does not report the budget, but allows 300 requests per
+    # minute for each token
+    rate_limit_defaults = {'limit': 300, 'window': 60.0}
 
     def __init__(self, *args, **kwargs):
         self._contacts = None
+        self._users = None
         super(SmartsheetAPI, self).__init__(*args, **kwargs)
 
     @property
@@ -987,27 +1846,87 @@ class SmartsheetAPI(UpdateAPI):
         r"""str: The address associated with the remote project data."""
         return self.config['smartsheet']['sheet']
 
+    @property
+    def directory(self):
+        r"""directory.Directory: Stored contacts and users for the account
+        associated with the API's token."""
+
+        def fetch_contacts():
+            return [{'id': x.id_, 'name': x.name, 'email': x.email}
+                    for x in self.api.Contacts.list_contacts(
+                        include_all=True).data]
+
+        def fetch_users():
+            return [{'id': x.id, 'email': x.email,
+                     'name': x.name or ' '.join(
+                         [y for y in (x.first_name, x.last_name) if y])}
+                    for x in self.api.Users.list_users(
+                        include_all=True).data]
+
+        ttl = self.config.getfloat('smartsheet', 'directory_ttl_hours',
+                                   fallback=24)
+        return directory.get_directory(
+            self.name, self.token,
+            {'contacts': fetch_contacts, 'users': fetch_users},
+            ttl=ttl * 3600)
+
     @property
     def contacts(self):
         r"""list: Contacts associated with the sheet."""
         if self._contacts is None:
-            self._contacts = self.api.Contacts.list_contacts(
-                include_all=True).data
+            self._contacts = [self.entry2contact(x) for x in
+                              self.directory.entries('contacts')]
         return self._contacts
 
     @property
     def users(self):
         r"""list: Users associated with the sheet."""
         if self._users is None:
-            self._users = self.api.Users.list_users(
-                include_all=True).data
+            self._users = self.directory.entries('users')
         return self._users
 
     @classmethod
-    def get_api(cls, token=None):
-        r"""Return the top level API object."""
-        smart = smartsheet.Smartsheet(token)
+    def entry2contact(cls, entry):
+        r"""Get a Smartsheet contact from a directory entry.
+
+        Args:
+            entry (dict): Directory entry.
+
+        Returns:
+            smartsheet.models.Contact: Contact.
+
+        """
+        import smartsheet
+        return smartsheet.models.Contact(entry)
+
+    def get_contact(self, name=None, email=None):
+        r"""Get the Smartsheet contact with a name or email address,
+        refreshing the stored contacts if there is not a match.
+
+        Args:
+            name (str, optional): Name of the contact. Defaults to None.
+            email (str, optional): Email address of the contact. Defaults to
+                None.
+
+        Returns:
+            smartsheet.models.Contact: Contact, None if there is not one.
+
+        """
+        out = self.directory.get('contacts', name=name, email=email)
+        if out is None:
+            return None
+        return self.entry2contact(out)
+
+    @classmethod
+    def create_api(cls, token=None):
+        r"""Create a new top level API object."""
+        import smartsheet
+        # Rate limited requests are retried by the limiter, so the client's
+        # own retries are disabled to avoid nesting them
+        smart = smartsheet.Smartsheet(token, max_retry_time=0)
         smart.errors_as_exceptions(True)
+        httpcache.wrap_smartsheet(smart)
+        ratelimit.wrap_smartsheet(smart, cls.get_rate_limiter(token=token))
         return smart
 
     @classmethod
@@ -1048,88 +1967,421 @@ class SmartsheetAPI(UpdateAPI):
 
     def load_remote(self, address, default=False):
         r"""Get the remote data for the specified address."""
+        from smartsheet.exceptions import ApiError
+        sheet_id = self.get_cached_id('sheet', address)
+        if sheet_id is not None:
+            try:
+                out = self.api.Sheets.get_sheet(sheet_id)
+                if out.name == address:
+                    return out
+            except ApiError:
+                pass
         sheet_list = self.api.Sheets.list_sheets(include_all=True)
         try:
             out = self.get_entry(sheet_list.result, 'name', address,
                                  by_attr=True)
-            return self.api.Sheets.get_sheet(out.id)
         except ValueError:
             if default is not False:
                 return default
             raise
+        self.set_cached_ids('sheet', {address: out.id})
+        return self.api.Sheets.get_sheet(out.id)
+
+    @classmethod
+    def cell2csv(cls, cell, column=None):
+        r"""Get the string representing a cell in a CSV export of a sheet.
+        The API returns dates as ISO 8601 values without a display value, so
+        they are formatted as they are in the export ('%m/%d/%y').
+
+        Args:
+            cell (smartsheet.models.Cell): Cell to convert.
+            column (smartsheet.models.Column, optional): Column containing
+                the cell. Defaults to None and the cell is converted based
+                on its value alone.
+
+        Returns:
+            str: Value of the cell as it appears in a CSV file.
+
+        """
+        column_type = str(getattr(column, 'type', None))
+        if (column_type in ['DATE', 'ABSTRACT_DATETIME']) and cell.value:
+            t = datetime.datetime.strptime(str(cell.value)[:10], '%Y-%m-%d')
+            return t.strftime('%m/%d/%y')
+        if (column_type == 'CHECKBOX') and isinstance(cell.value, bool):
+            return str(cell.value).lower()
+        if cell.display_value is not None:
+            return str(cell.display_value)
+        if cell.value is None:
+            return ''
+        return str(cell.value)
+
+    @classmethod
+    def row2csv(cls, row, columns):
+        r"""Get the values in a row in the order of the provided columns.
+
+        Args:
+            row (smartsheet.models.Row): Row to convert.
+            columns (list): Columns in the sheet.
+
+        Returns:
+            list: Values of the cells in the row as they appear in a CSV file.
+
+        """
+        cells = {c.column_id: c for c in row.cells}
+        out = []
+        for col in columns:
+            if col.id in cells:
+                out.append(cls.cell2csv(cells[col.id], col))
+            else:
+                out.append('')
+        return out
+
+    @classmethod
+    def write_csv(cls, address, columns, rows):
+        r"""Write rows of CSV values to a file.
+
+        Args:
+            address (str): Path to the file that should be created.
+            columns (list): Column titles.
+            rows (list): Values in each row.
+
+        """
+        with open(address, 'w', newline='') as fd:
+            writer = csv.writer(fd)
+            writer.writerow(columns)
+            writer.writerows(rows)
+
+    def sheet2index(self, sheet):
+        r"""Convert a sheet into the CSV values that should be recorded for
+        the snapshot.
+
+        Args:
+            sheet (smartsheet.models.Sheet): Sheet to convert.
+
+        Returns:
+            dict: Sheet ID, column titles and the ID, parent ID and CSV
+                values for each row in the order they appear in the sheet.
+
+        """
+        return {'address': self.remote_address,
+                'sheet_id': sheet.id,
+                'columns': [c.title for c in sheet.columns],
+                'rows': [{'id': row.id, 'parent_id': row.parent_id,
+                          'cells': self.row2csv(row, sheet.columns)}
+                         for row in sheet.rows]}
+
+    def download_incremental(self, address, index):
+        r"""Download remote data to the specified local address using the
+        data from the last snapshot. If the sheet version has not changed,
+        the last snapshot is reused. Otherwise, the rows modified since the
+        last snapshot and their parents are fetched and patched into the
+        last snapshot.
+
+        Args:
+            address (str): Address where object should be saved.
+            index (dict): Data from the last snapshot.
+
+        Returns:
+            bool: True if the data was downloaded, False if a full snapshot
+                is required because rows were added, removed or moved or the
+                columns changed.
+
+        """
+        from smartsheet.exceptions import ApiError
+        time_format = self.config['general']['time_format']
+        now = datetime.datetime.utcnow()
+        try:
+            version = self.api.Sheets.get_sheet_version(
+                index['sheet_id']).version
+        except ApiError:
+            return False
+        if version == index['version']:
+            self.logger.debug("Smartsheet version unchanged (%s)" % version)
+            with open(address, 'w', newline='') as fd:
+                fd.write(index['csv'])
+            return True
+        # Overlap with the previous snapshot to allow for clock skew
+        since = (datetime.datetime.strptime(index['timestamp'], time_format)
+                 - datetime.timedelta(minutes=10))
+        self.logger.debug("Fetching Smartsheet rows modified since %s"
+                          % since)
+        sheet = self.api.Sheets.get_sheet(
+            index['sheet_id'],
+            rows_modified_since=since.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        if ((([c.title for c in sheet.columns] != index['columns'])
+             or (sheet.total_row_count != len(index['rows'])))):
+            return False
+        # Moving a row does not modify the rows it is moved past, so the
+        # order and hierarchy are checked using a single column of every row
+        structure = self.api.Sheets.get_sheet(
+            index['sheet_id'], column_ids=[sheet.columns[0].id])
+        if (([(row.id, row.parent_id) for row in structure.rows]
+             != [(x['id'], x.get('parent_id', None))
+                 for x in index['rows']])):
+            self.logger.debug("Smartsheet rows were added, removed or moved")
+            return False
+        rows = OrderedDict([(x['id'], x) for x in index['rows']])
+        modified = list(sheet.rows)
+        if any([row.id not in rows for row in modified]):
+            return False
+        # Parent rows roll up values (e.g. dates) from their children
+        # without being marked as modified, so the ancestors of modified
+        # rows are fetched as well
+        ancestors = set()
+        for row in modified:
+            parent_id = rows[row.id].get('parent_id', None)
+            while (parent_id is not None) and (parent_id not in ancestors):
+                ancestors.add(parent_id)
+                parent_id = rows[parent_id].get('parent_id', None)
+        ancestors -= set([row.id for row in modified])
+        if ancestors:
+            modified += self.api.Sheets.get_sheet(
+                index['sheet_id'], row_ids=sorted(ancestors)).rows
+        for row in modified:
+            rows[row.id]['cells'] = self.row2csv(row, sheet.columns)
+        self.write_csv(address, index['columns'],
+                       [x['cells'] for x in index['rows']])
+        self.update_snapshot_index(index, address, sheet.version, now)
+        return True
+
+    def update_snapshot_index(self, index, address, version, now):
+        r"""Update the data from the last snapshot and save it.
+
+        Args:
+            index (dict): Data from the last snapshot.
+            address (str): Path to the CSV file for the snapshot.
+            version (int): Version of the sheet in the snapshot.
+            now (datetime.datetime): Time that the snapshot was started.
+
+        """
+        with open(address, 'r', newline='') as fd:
+            index['csv'] = fd.read()
+        index['version'] = version
+        index['timestamp'] = now.strftime(
+            self.config['general']['time_format'])
+        utils.dump_json(self.snapshot_index_file, index)
 
     def download_remote(self, address):
         r"""Download remote data to the specified local address."""
-        fname_dir = os.path.dirname(address)
-        fname_download = os.path.join(fname_dir, self.remote_data.name)
-        fname_download += '.csv'
-        self.api.Sheets.get_sheet_as_csv(self.remote_data.id, fname_dir)
-        assert(os.path.isfile(fname_download))
-        shutil.move(fname_download, address)
+        index = self.load_snapshot_index()
+        if (index is not None) and self.download_incremental(address, index):
+            return
+        self.logger.debug("Taking full snapshot of Smartsheet sheet")
+        now = datetime.datetime.utcnow()
+        index = self.sheet2index(self.remote_data)
+        index['last_full'] = now.strftime(
+            self.config['general']['time_format'])
+        self.write_csv(address, index['columns'],
+                       [x['cells'] for x in index['rows']])
+        self.update_snapshot_index(index, address, self.remote_data.version,
+                                   now)
+
+    def build_cells(self, x, columns_map, prev=None):
+        r"""Get the cells that should be sent to Smartsheet for a row.
+
+        Args:
+            x (dict): Local data for the row.
+            columns_map (dict): Mapping from column titles to Smartsheet
+                columns.
+            prev (smartsheet.models.Row, optional): Existing row that the
+                cells will update. Defaults to None and all of the non-empty
+                cells are returned.
+
+        Returns:
+            list: Smartsheet cells that differ from prev.
+
+        Raises:
+            ValueError: If there is not a contact for the assignee.
+
+        """
+        import smartsheet
+        out = []
+        for k in columns_map.keys():
+            if k not in x:
+                continue
+            v = x[k]
+            objv = None
+            # YYYY-MM-DDTHH:MM:SSZ ISO 8601 format required
+            if k in ['Start', 'Finish']:
+                t = datetime.datetime.strptime(v, "%m/%d/%y").replace(
+                    hour=8)
+                v = t.isoformat()
+                if k in ['Finish']:
+                    continue
+            elif k in ['Assigned To'] and v:
+                objv = self.get_contact(name=v)
+                if objv is None:
+                    raise ValueError("No contact associated with name: %s"
+                                     % v)
+                v = objv.email
+            icell = smartsheet.models.Cell()
+            icell.column_id = columns_map[k].id
+            icell.value = v
+            if objv is not None:
+                icell.objectValue = objv
+            icell.strict = True
+            prev_value = None
+            if prev is not None:
+                prev_value = prev.get_column(columns_map[k].id).value
+            if (((icell.value != prev_value)
+                 and (icell.value or prev_value))):
+                out.append(icell)
+        return out
 
     def upload_remote(self, data):
-        r"""Upload new data to the remote.
+        r"""Upload new data to the remote. Changed rows are updated and new
+        rows are added in chunks of at most 'row_chunk_size' rows that are
+        sent concurrently. Rows that Smartsheet rejects are reported without
+        aborting the rest of the chunk. New supporting objectives are added
+        beneath the goal matching their number (e.g. 'Goal 2' for
+        'Supporting objective 2A') and other new objectives are skipped.
 
         Args:
             data (dict): Data that should be uploaded.
 
+        Returns:
+            list: For each row that was sent, the type of row, title,
+                action, outcome ('ok', 'failed' or 'skipped') and error
+                message.
+
         """
+        import smartsheet
         title_key = 'Task Name'
         # Create maps from strings to Smartsheet objects
         columns_map = OrderedDict()
         for col in self.remote_data.columns:
             columns_map[col.title] = col
-        contacts_map = {}
-        for contact in self.contacts:
-            contacts_map[contact.name] = contact
-        if not contacts_map:
+        if not self.contacts:
             raise ValueError(("Your contacts list is empty. Upload contacts "
                               "from the contacts files: %s")
                              % self.config['general']['contacts_file'])
+        title_id = columns_map[title_key].id
+        regex_goal = r'Goal ([0-9]+)'
+        regex_obj = r'Supporting objective ([0-9]+)'
         rows_map = {}
-        updated_rows = []
+        objective_ids = {}
+        goal_ids = {}
         for row in self.remote_data.rows:
-            title_cell = row.get_column(columns_map[title_key].id)
-            rows_map[title_cell.value] = row
-        # for x_orig in data['objectives'] + data['milestones']:
-        for x_orig in data['milestones']:
-            assert(x_orig[title_key] in rows_map)
-            irow_prev = rows_map[x_orig[title_key]]
-            irow = smartsheet.models.Row()
-            irow.id = irow_prev.id
-            for k in columns_map.keys():
-                if k not in x_orig:
+            title = row.get_column(title_id).value
+            rows_map[title] = row
+            if not title:
+                continue
+            if title.startswith('Supporting objective'):
+                # Milestones reference objectives by the title of the
+                # corresponding Github milestone
+                objective_ids[title.split(': ')[0]] = row.id
+            elif re.match(regex_goal, title):
+                goal_ids[re.match(regex_goal, title).group(1)] = row.id
+        results = []
+        updated = []
+        added_objectives = []
+        added_milestones = OrderedDict()
+        missing = []
+        for rtype, rows in [('objective', data['objectives']),
+                            ('milestone', data['milestones'])]:
+            for x in rows:
+                title = x[title_key]
+                irow_prev = rows_map.get(title, None)
+                # Existing objectives are calculated from their milestones
+                if (rtype == 'objective') and (irow_prev is not None):
                     continue
-                v = x_orig[k]
-                objv = None
-                # YYYY-MM-DDTHH:MM:SSZ ISO 8601 format required
-                if k in ['Start', 'Finish']:
-                    t = datetime.datetime.strptime(v, "%m/%d/%y").replace(
-                        hour=8)
-                    v = t.isoformat()
-                    if k in ['Finish']:
+                if rtype == 'objective':
+                    match = re.match(regex_obj, title)
+                    if not match:
+                        results.append((rtype, title, 'create', 'skipped',
+                                        "Not a supporting objective"))
+                        continue
+                    if match.group(1) not in goal_ids:
+                        results.append((rtype, title, 'create', 'failed',
+                                        "No row for Goal %s"
+                                        % match.group(1)))
                         continue
-                elif k in ['Assigned To']:
-                    if v not in contacts_map:
-                        raise ValueError("No contact associated with name: %s"
-                                         % v)
-                    objv = contacts_map[v]
-                    v = objv.email
-                icell_prev = irow_prev.get_column(columns_map[k].id)
-                icell = smartsheet.models.Cell()
-                icell.column_id = columns_map[k].id
-                icell.value = v
-                if objv is not None:
-                    icell.objectValue = objv
-                icell.strict = True
-                if (((icell.value != icell_prev.value)
-                     and (icell.value or icell_prev.value))):
-                    irow.cells.append(icell)
-            if len(irow.cells):
-                updated_rows.append(irow)
-        if updated_rows:
-            updated_rows = self.api.Sheets.update_rows(
-                self.remote_data.id, updated_rows)
+                irow = smartsheet.models.Row()
+                try:
+                    irow.cells = self.build_cells(x, columns_map, irow_prev)
+                except ValueError as e:
+                    results.append((rtype, title, 'update' if irow_prev
+                                    else 'create', 'failed', str(e)))
+                    continue
+                if irow_prev is not None:
+                    if len(irow.cells):
+                        irow.id = irow_prev.id
+                        updated.append((rtype, title, irow))
+                elif rtype == 'objective':
+                    irow.parent_id = goal_ids[match.group(1)]
+                    irow.to_bottom = True
+                    added_objectives.append((rtype, title, irow))
+                elif x.get('Supporting Objective', None) is None:
+                    missing.append((rtype, title, irow))
+                else:
+                    irow.to_bottom = True
+                    added_milestones.setdefault(
+                        x['Supporting Objective'], []).append(
+                            (rtype, title, irow))
+        if not (updated or added_objectives or added_milestones
+                or missing or results):
+            return []
+        chunk_size = self.config.getint('smartsheet', 'row_chunk_size',
+                                        fallback=100)
+        nthreads = self.config.getint('smartsheet', 'upload_threads',
+                                      fallback=4)
+        lock = threading.Lock()
+
+        def chunks(x):
+            return [x[i:(i + chunk_size)]
+                    for i in range(0, len(x), chunk_size)]
+
+        def send(method, chunk, failures):
+            # Failures are recorded by the index of the row in the chunk
+            result = method(self.remote_data.id, [r[2] for r in chunk])
+            for x in (result.failed_items or []):
+                failures[x.index] = getattr(x.error, 'message', str(x.error))
+            with lock:
+                for row in (result.data or []):
+                    title = row.get_column(title_id).value
+                    if title and title.startswith('Supporting objective'):
+                        objective_ids[title.split(': ')[0]] = row.id
+
+        def run(batches):
+            # Record the outcome of each row in the chunks
+            failures = [{} for _ in batches]
+            tasks = [((action,), functools.partial(send, method, chunk,
+                                                   failures[i]))
+                     for i, (action, method, chunk) in enumerate(batches)]
+            for (action, method, chunk), ifailures, out in zip(
+                    batches, failures,
+                    utils.run_tasks(tasks, max_workers=nthreads)):
+                for i, (rtype, title, irow) in enumerate(chunk):
+                    error = out[-1] or ifailures.get(i, '')
+                    results.append((rtype, title, action,
+                                    'failed' if error else 'ok', error))
+
+        update_rows = self.api.Sheets.update_rows_with_partial_success
+        add_rows = self.api.Sheets.add_rows_with_partial_success
+        nrequests = (len(chunks(updated)) + len(chunks(added_objectives))
+                     + sum([len(chunks(v))
+                            for v in added_milestones.values()]))
+        self.rate_limiter.check_budget(nrequests, 'Smartsheet upload')
+        # Objectives are added first so that new milestones can be added
+        # beneath them
+        run([('update', update_rows, x) for x in chunks(updated)]
+            + [('create', add_rows, x) for x in chunks(added_objectives)])
+        # Rows added in one request must share a location
+        batches = []
+        for objective, v in added_milestones.items():
+            if objective not in objective_ids:
+                missing += v
+                continue
+            for rtype, title, irow in v:
+                irow.parent_id = objective_ids[objective]
+            batches += [('create', add_rows, x) for x in chunks(v)]
+        run(batches)
+        for rtype, title, irow in missing:
+            results.append((rtype, title, 'create', 'failed',
+                            "No row for the supporting objective"))
+        self.logger.info("Smartsheet updates:\n%s" % utils.format_table(
+            results, ['type', 'title', 'action', 'outcome', 'error']))
+        return results
 
     @classmethod
     def get_objective_from_Github_milestone(cls, milestone):
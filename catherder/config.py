@@ -2,6 +2,8 @@ import os
 import sys
 import logging
 import shutil
+import threading
+from collections import OrderedDict
 if sys.version_info[0] == 2:  # pragma: Python 2
     from backports import configparser
     input = raw_input
@@ -15,16 +17,36 @@ else:  # pragma: Python 3
 logger = logging.getLogger(__name__)
 
 
-# Create user config file
+# Locations of config files
 this_dir = os.path.dirname(__file__)
 project_dir = os.path.expanduser(os.path.join('~', '.catherder_projects'))
 def_config_file = os.path.join(this_dir, 'default_project.cfg')
 usr_config_file = os.path.expanduser(os.path.join('~', '.catherder.cfg'))
 usr_config_file_old = os.path.expanduser(os.path.join(
     '~', '.CiS2.0_management.cfg'))
-if not os.path.isdir(project_dir):
-    os.mkdir(project_dir)
-if not os.path.isfile(usr_config_file):
+# Parsed config files keyed by file modification times
+_config_cache = {}
+_config_lock = threading.Lock()
+
+
+def get_default_config():
+    r"""Get the config for the default project. The config files are read on
+    the first call rather than on import and then only when they change.
+
+    Returns:
+        configparser.ConfigParser: Config for the default project.
+
+    """
+    return read_project_config(project_name=True)
+
+
+def setup_user_config():
+    r"""Create the project directory and user config file if they do not
+    exist."""
+    if not os.path.isdir(project_dir):
+        os.mkdir(project_dir)
+    if os.path.isfile(usr_config_file):
+        return
     if os.path.isfile(usr_config_file_old):  # pragma: no cover
         # This specifically handles backwards compatibility with the previous
         # iteration which was catered to a specific project
@@ -53,8 +75,60 @@ if not os.path.isfile(usr_config_file):
                     % (usr_config_file, def_config_file))
 
 
+def read_config_files(fnames=None):
+    r"""Read config files, reusing the result of a previous read if none of
+    the files have been modified since.
+
+    Args:
+        fnames (list, optional): Config files that should be read in order.
+            Defaults to the default and user config files.
+
+    Returns:
+        configparser.ConfigParser: A new parser containing the options from
+            the files that can be modified without affecting the cache.
+
+    """
+    if fnames is None:
+        setup_user_config()
+        fnames = [def_config_file, usr_config_file]
+    key = []
+    for x in fnames:
+        if os.path.isfile(x):
+            st = os.stat(x)
+            key.append((x, st.st_mtime, st.st_size))
+        else:
+            key.append((x, None, None))
+    key = tuple(key)
+    with _config_lock:
+        if key not in _config_cache:
+            config = configparser.ConfigParser(
+                interpolation=configparser.ExtendedInterpolation())
+            config.read(fnames)
+            _config_cache.clear()
+            _config_cache[key] = config
+        return copy_config(_config_cache[key])
+
+
+def copy_config(config):
+    r"""Create a copy of a config parser.
+
+    Args:
+        config (configparser.ConfigParser): Parser to copy.
+
+    Returns:
+        configparser.ConfigParser: Copy of the parser.
+
+    """
+    out = configparser.ConfigParser(
+        interpolation=configparser.ExtendedInterpolation())
+    out.read_dict(OrderedDict([(k, OrderedDict(config.items(k, raw=True)))
+                               for k in config.sections()]))
+    return out
+
+
 def initial_config():
     r"""Perform initial configuration steps, asking for user input."""
+    setup_user_config()
     usr_config = configparser.ConfigParser(
         interpolation=configparser.ExtendedInterpolation())
     usr_config.read(usr_config_file)
@@ -66,9 +140,6 @@ def initial_config():
         'What is your Smartsheet authenticaiton token?: ')
     with open(usr_config_file, 'w') as fd:
         usr_config.write(fd)
-    # Update default_config by re-reading updated files
-    global default_config
-    default_config.read([def_config_file, usr_config_file])
 
 
 def read_project_config(project_name=None):
@@ -91,9 +162,7 @@ def read_project_config(project_name=None):
             option is not set in the 'general' section of the config file.
 
     """
-    config = configparser.ConfigParser(
-        interpolation=configparser.ExtendedInterpolation())
-    config.read([def_config_file, usr_config_file])
+    config = read_config_files()
     if (project_name is None) and config.has_option('general',
                                                     'default_project'):
         project_name = config['general']['default_project']
@@ -132,6 +201,9 @@ def read_project_config(project_name=None):
                 config[project_name]['contacts_file'])
         if config.has_option(project_name, 'github_token'):
             config['github']['token'] = config[project_name]['github_token']
+        if config.has_option(project_name, 'github_read_tokens'):
+            config['github']['read_tokens'] = (
+                config[project_name]['github_read_tokens'])
         if config.has_option(project_name, 'smartsheet_token'):
             config['smartsheet']['token'] = (
                 config[project_name]['smartsheet_token'])
@@ -144,5 +216,3 @@ def read_project_config(project_name=None):
         config['smartsheet']['cache_file_format'])
     return config
 
-
-default_config = read_project_config(project_name=True)
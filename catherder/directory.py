@@ -0,0 +1,171 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from catherder import config, utils
+logger = logging.getLogger(__name__)
+# Directories shared by every client using the same credentials
+_directory_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Directory(object):
+    r"""On disk index of the people (e.g. contacts and users) associated
+    with an account that is refreshed from the service when it is older
+    than a time to live or when a lookup misses.
+
+    Args:
+        fname (str): File where the index is stored.
+        fetch (dict): Mapping from the kind of entry (e.g. 'contacts') to a
+            function that takes no arguments and returns a list of entries
+            from the service. Each entry should be a dictionary with at
+            least 'name' and 'email' keys.
+        ttl (float, optional): Time in seconds after which the entries
+            are refreshed. Defaults to 86400 (1 day).
+
+    """
+
+    def __init__(self, fname, fetch, ttl=86400.0):
+        self.fname = fname
+        self.fetch = fetch
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._data = None
+        self._index = {}
+        self._refreshed = set()
+
+    @property
+    def data(self):
+        r"""dict: Stored entries ('entries') and the time when each kind of
+        entry was fetched in seconds since the epoch ('time')."""
+        if self._data is None:
+            self._data = utils.load_json(self.fname,
+                                         {'entries': {}, 'time': {}})
+            for kind, entries in self._data['entries'].items():
+                self._index[kind] = self.build_index(entries)
+        return self._data
+
+    @classmethod
+    def build_index(cls, entries):
+        r"""Create the lookup tables for a list of entries.
+
+        Args:
+            entries (list): Entries with 'name' and 'email' keys.
+
+        Returns:
+            dict: Mapping from 'name' and 'email' to dictionaries mapping
+                from each value (email addresses in lower case) to the entry.
+
+        """
+        out = {'name': {}, 'email': {}}
+        for x in entries:
+            if x.get('name', None):
+                out['name'][x['name']] = x
+            if x.get('email', None):
+                out['email'][x['email'].lower()] = x
+        return out
+
+    def is_expired(self, kind):
+        r"""Determine if the entries of a kind should be refreshed.
+
+        Args:
+            kind (str): Kind of entry.
+
+        Returns:
+            bool: True if the entries have not been fetched or are older
+                than the time to live.
+
+        """
+        fetched = self.data['time'].get(kind, None)
+        return (fetched is None) or ((time.time() - fetched) > self.ttl)
+
+    def refresh(self, kind):
+        r"""Fetch the entries of a kind from the service and store them.
+
+        Args:
+            kind (str): Kind of entry.
+
+        """
+        logger.info("Refreshing %s from the service" % kind)
+        entries = self.fetch[kind]()
+        self.data['entries'][kind] = entries
+        self.data['time'][kind] = time.time()
+        self._index[kind] = self.build_index(entries)
+        self._refreshed.add(kind)
+        directory = os.path.dirname(self.fname)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        utils.dump_json(self.fname, self.data)
+
+    def entries(self, kind):
+        r"""Get the entries of a kind, refreshing them if they have expired.
+
+        Args:
+            kind (str): Kind of entry.
+
+        Returns:
+            list: Entries.
+
+        """
+        with self.lock:
+            if self.is_expired(kind):
+                self.refresh(kind)
+            return self.data['entries'][kind]
+
+    def get(self, kind, name=None, email=None):
+        r"""Get an entry by name or email address. The entries are refreshed
+        once per process if there is not a match.
+
+        Args:
+            kind (str): Kind of entry.
+            name (str, optional): Name of the entry. Defaults to None.
+            email (str, optional): Email address of the entry (not case
+                sensitive). Defaults to None.
+
+        Returns:
+            dict: Matching entry, None if there is not one.
+
+        """
+        if name is not None:
+            key, value = 'name', name
+        else:
+            key, value = 'email', email.lower()
+        with self.lock:
+            if self.is_expired(kind):
+                self.refresh(kind)
+            out = self._index[kind][key].get(value, None)
+            if (out is None) and (kind not in self._refreshed):
+                self.refresh(kind)
+                out = self._index[kind][key].get(value, None)
+            return out
+
+
+def get_directory(name, token, fetch, ttl=86400.0):
+    r"""Get the directory for an account, creating it if one has not been
+    created yet. The directory is stored in the '.directory' directory of
+    the project directory under a hash of the token so that it is shared by
+    every project using the same account without storing the token.
+
+    Args:
+        name (str): Name of the service.
+        token (str): Authentication token.
+        fetch (dict): Functions that fetch each kind of entry (see
+            Directory).
+        ttl (float, optional): Time in seconds after which the entries
+            are refreshed. Defaults to 86400 (1 day).
+
+    Returns:
+        Directory: Directory for the account.
+
+    """
+    with _registry_lock:
+        key = (name, token)
+        if key not in _directory_registry:
+            account = hashlib.sha256(
+                ('%s\0%s' % (name, token or '')).encode('utf-8'))
+            fname = os.path.join(config.project_dir, '.directory',
+                                 '%s_%s.json' % (name,
+                                                 account.hexdigest()[:16]))
+            _directory_registry[key] = Directory(fname, fetch, ttl=ttl)
+        return _directory_registry[key]
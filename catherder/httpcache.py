@@ -0,0 +1,256 @@
+import os
+import base64
+import hashlib
+import logging
+import threading
+from catherder import config, utils
+logger = logging.getLogger(__name__)
+# Cache shared by all of the clients in the process
+_cache = None
+_cache_lock = threading.Lock()
+enabled = True
+
+
+class HTTPCache(object):
+    r"""On disk cache of responses to GET requests that replays the cached
+    body when the server confirms that it has not changed (304 Not Modified)
+    in response to a conditional request. Conditional requests answered
+    with 304 do not count against the Github rate limit.
+
+    Args:
+        directory (str): Directory where responses are stored.
+        max_size (int, optional): Maximum total size of the stored responses
+            in bytes. The least recently used responses are removed when the
+            limit is exceeded. Defaults to 100 MB.
+
+    """
+
+    def __init__(self, directory, max_size=100 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self._size = None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, url, auth=None):
+        r"""Get the file where the response for a request is stored. Tokens
+        are only used in the hash so they are not stored on disk.
+
+        Args:
+            url (str): URL of the request.
+            auth (str, optional): Authorization header sent with the
+                request. Defaults to None.
+
+        Returns:
+            str: Path to the file.
+
+        """
+        key = hashlib.sha256(('%s\0%s' % (url, auth or '')).encode('utf-8'))
+        return os.path.join(self.directory, key.hexdigest() + '.json')
+
+    def get(self, url, auth=None):
+        r"""Get a stored response, marking it as recently used.
+
+        Args:
+            url (str): URL of the request.
+            auth (str, optional): Authorization header sent with the
+                request. Defaults to None.
+
+        Returns:
+            dict: Stored response, None if there is not one.
+
+        """
+        fname = self.path(url, auth)
+        with self.lock:
+            entry = utils.load_json(fname)
+            if entry is not None:
+                os.utime(fname, None)
+        return entry
+
+    def set(self, url, auth, headers, body):
+        r"""Store a response if it has a validator (ETag or Last-Modified).
+
+        Args:
+            url (str): URL of the request.
+            auth (str): Authorization header sent with the request.
+            headers (dict): Response headers with lower case names.
+            body (str, bytes): Response body.
+
+        """
+        if not (headers.get('etag', None)
+                or headers.get('last-modified', None)):
+            return
+        entry = {'url': url, 'headers': dict(headers)}
+        if isinstance(body, bytes):
+            entry['body64'] = base64.b64encode(body).decode('ascii')
+        else:
+            entry['body'] = body
+        fname = self.path(url, auth)
+        with self.lock:
+            old_size = 0
+            if os.path.isfile(fname):
+                old_size = os.path.getsize(fname)
+            utils.dump_json(fname, entry)
+            self._size = (self.size() - old_size + os.path.getsize(fname))
+            if self._size > self.max_size:
+                self.evict()
+
+    def size(self):
+        r"""int: Total size of the stored responses in bytes."""
+        if self._size is None:
+            self._size = sum([os.path.getsize(x) for x in self.entries()])
+        return self._size
+
+    def entries(self):
+        r"""list: Files containing stored responses."""
+        return [os.path.join(self.directory, x)
+                for x in os.listdir(self.directory) if x.endswith('.json')]
+
+    def evict(self):
+        r"""Remove the least recently used responses until the total size is
+        below the limit."""
+        files = sorted(self.entries(), key=os.path.getmtime)
+        self._size = sum([os.path.getsize(x) for x in files])
+        while files and (self._size > self.max_size):
+            x = files.pop(0)
+            self._size -= os.path.getsize(x)
+            os.remove(x)
+
+    def request(self, url, auth, headers, send):
+        r"""Send a request, making it conditional if a response is stored.
+
+        Args:
+            url (str): URL of the request.
+            auth (str): Authorization header sent with the request.
+            headers (dict): Request headers.
+            send (callable): Function that takes the request headers, sends
+                the request and returns the status, response headers (with
+                lower case names) and body.
+
+        Returns:
+            tuple: Status, response headers and body. A 304 response is
+                replaced by the stored response with status 200.
+
+        """
+        entry = self.get(url, auth)
+        if entry is not None:
+            headers = dict(headers)
+            if entry['headers'].get('etag', None):
+                headers['If-None-Match'] = entry['headers']['etag']
+            if entry['headers'].get('last-modified', None):
+                headers['If-Modified-Since'] = (
+                    entry['headers']['last-modified'])
+        status, resp_headers, body = send(headers)
+        if (status == 304) and (entry is not None):
+            logger.debug("Using cached response for %s" % url)
+            # Keep current values for headers such as the rate limit
+            out_headers = dict(entry['headers'])
+            out_headers.update(resp_headers)
+            if 'body64' in entry:
+                return 200, out_headers, base64.b64decode(entry['body64'])
+            return 200, out_headers, entry['body']
+        if status == 200:
+            self.set(url, auth, resp_headers, body)
+        return status, resp_headers, body
+
+
+def disable():
+    r"""Disable the HTTP cache."""
+    global enabled
+    enabled = False
+
+
+def get_cache():
+    r"""Get the HTTP cache shared by all of the clients in the process.
+
+    Returns:
+        HTTPCache: HTTP cache stored in the '.http_cache' directory of the
+            project directory, None if the cache is disabled.
+
+    """
+    global _cache
+    if not enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            cfg = config.read_config_files()
+            max_size = cfg.getfloat('general', 'http_cache_size_mb',
+                                    fallback=100)
+            _cache = HTTPCache(os.path.join(config.project_dir,
+                                            '.http_cache'),
+                               max_size=int(max_size * 1024 * 1024))
+        return _cache
+
+
+def wrap_github(requester):
+    r"""Make the GET requests sent by a PyGithub requester conditional on
+    the responses stored in the HTTP cache.
+
+    Args:
+        requester (github.Requester.Requester): Requester shared by the
+            objects created from a Github client.
+
+    """
+    raw = requester._Requester__requestRaw
+    if (not enabled) or getattr(raw, 'http_cache', False):
+        return
+
+    def request_raw(cnx, verb, url, headers, input, *args, **kwargs):
+        if (not enabled) or (verb != 'GET') or kwargs.get('stream', False):
+            return raw(cnx, verb, url, headers, input, *args, **kwargs)
+        return get_cache().request(
+            url, headers.get('Authorization', None), headers,
+            lambda h: raw(cnx, verb, url, h, input, *args, **kwargs))
+
+    request_raw.http_cache = True
+    requester._Requester__requestRaw = request_raw
+
+
+def wrap_smartsheet(smart):
+    r"""Make the GET requests sent by a Smartsheet client conditional on the
+    responses stored in the HTTP cache.
+
+    Args:
+        smart (smartsheet.Smartsheet): Smartsheet client.
+
+    """
+    import requests
+    from smartsheet.smartsheet import OperationResult
+    raw = smart._request
+    if (not enabled) or getattr(raw, 'http_cache', False):
+        return
+
+    def request(prepped_request, operation):
+        if ((not enabled) or (prepped_request.method != 'GET')
+                or operation['dl_path']):
+            return raw(prepped_request, operation)
+        results = []
+
+        def send(headers):
+            # Send a copy so the token is not redacted in the original
+            req = prepped_request.copy()
+            req.headers.update(headers)
+            results.append(raw(req, operation))
+            resp = results[-1].resp
+            return (resp.status_code,
+                    {k.lower(): v for k, v in resp.headers.items()},
+                    resp.content)
+
+        status, headers, body = get_cache().request(
+            prepped_request.url,
+            prepped_request.headers.get('Authorization', None), {}, send)
+        if results[-1].resp.status_code != 304:
+            return results[-1]
+        # Replay the stored response as if it had been returned
+        resp = requests.models.Response()
+        resp.status_code = status
+        resp.headers.update(headers)
+        resp._content = body
+        resp.encoding = 'utf-8'
+        resp.url = prepped_request.url
+        resp.request = prepped_request
+        return OperationResult(resp.text, resp, smart, operation)
+
+    request.http_cache = True
+    smart._request = request
@@ -0,0 +1,408 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+logger = logging.getLogger(__name__)
+# Limiters shared by every client using the same credentials and the
+# additional tokens that reads made with a token may be spread across
+_limiter_registry = {}
+_pool_registry = {}
+_registry_lock = threading.Lock()
+
+
+class RateLimitExceeded(RuntimeError):
+    r"""Error raised when an operation requires more requests than remain in
+    the rate limit budget."""
+    pass
+
+
+class RateLimiter(object):
+    r"""Tracks the request budget for a set of credentials and paces
+    requests so that the budget lasts until it is reset.
+
+    Args:
+        name (str): Name of the service used in log messages.
+        limit (int, optional): Maximum number of requests allowed in each
+            window when the service does not report its budget in response
+            headers. Defaults to None and the number of requests is only
+            limited by the headers.
+        window (float, optional): Length of the window for limit in
+            seconds. Defaults to 60.
+        reserve (float, optional): Fraction of the budget below which
+            requests are spread evenly over the time until the budget is
+            reset. Defaults to 0.1.
+        max_retries (int, optional): Maximum number of times a rate limited
+            request is retried. Defaults to 5.
+        backoff (float, optional): Base time in seconds for the jittered
+            exponential backoff between retries. Defaults to 1.
+        max_wait (float, optional): Longest time in seconds that a request
+            waits for the budget to be reset. Defaults to 900.
+        resource (str, optional): Name of the rate limit resource (e.g.
+            'core', 'graphql' or 'search' for Github) that the budget
+            applies to. Headers reporting the budget for a different
+            resource are ignored. Defaults to None and all headers are used.
+
+    """
+
+    def __init__(self, name, limit=None, window=60.0, reserve=0.1,
+                 max_retries=5, backoff=1.0, max_wait=900.0, resource=None):
+        self.name = name
+        self.resource = resource
+        self.limit = limit
+        self.window = window
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.reset = None
+        self.blocked_until = 0.0
+        self._last = 0.0
+        self._sent = deque()
+
+    def budget(self):
+        r"""Get the current request budget.
+
+        Returns:
+            dict: Requests remaining ('remaining'), requests allowed in each
+                period ('limit') and the time when the budget is reset in
+                seconds since the epoch ('reset'). Unknown values are None.
+
+        """
+        with self.lock:
+            now = time.time()
+            remaining = self.remaining
+            reset = self.reset
+            if (reset is not None) and (reset <= now):
+                remaining = None
+                reset = None
+            if (remaining is None) and (self.limit is not None):
+                self._expire(now)
+                remaining = self.limit - len(self._sent)
+                if self._sent:
+                    reset = self._sent[0] + self.window
+            return {'remaining': remaining, 'limit': self.limit,
+                    'reset': reset}
+
+    def check_budget(self, nrequests, description='operation'):
+        r"""Refuse an operation that would exceed the request budget before
+        it is reset.
+
+        Args:
+            nrequests (int): Number of requests the operation requires.
+            description (str, optional): Description of the operation used
+                in the error message. Defaults to 'operation'.
+
+        Raises:
+            RateLimitExceeded: If the known budget is smaller than nrequests.
+
+        """
+        budget = self.budget()
+        if (budget['remaining'] is not None) and (
+                nrequests > budget['remaining']):
+            raise RateLimitExceeded(
+                ("The %s requires %d %s requests, but only %d remain until "
+                 "%s.") % (description, nrequests, self.name,
+                           budget['remaining'],
+                           time.strftime('%H:%M:%S',
+                                         time.localtime(budget['reset']))))
+
+    def _expire(self, now):
+        while self._sent and (self._sent[0] <= (now - self.window)):
+            self._sent.popleft()
+
+    def delay(self, now=None):
+        r"""Determine how long the next request should wait.
+
+        Args:
+            now (float, optional): Current time in seconds since the epoch.
+                Defaults to time.time().
+
+        Returns:
+            float: Time to wait in seconds.
+
+        """
+        if now is None:
+            now = time.time()
+        out = max(0.0, self.blocked_until - now)
+        if (self.remaining is not None) and (self.reset is not None) and (
+                self.reset > now):
+            if self.remaining <= 0:
+                out = max(out, self.reset - now)
+            elif (self.limit is not None) and (
+                    self.remaining < (self.reserve * self.limit)):
+                # Spread the remaining requests over the rest of the period
+                interval = (self.reset - now) / self.remaining
+                out = max(out, self._last + interval - now)
+        if (self.limit is not None) and (self.remaining is None):
+            self._expire(now)
+            if len(self._sent) >= self.limit:
+                out = max(out, self._sent[0] + self.window - now)
+        return out
+
+    def wait(self):
+        r"""Wait until the next request can be sent within the budget."""
+        while True:
+            with self.lock:
+                delay = self.delay()
+                if delay <= 0:
+                    now = time.time()
+                    self._last = now
+                    self._sent.append(now)
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+            if delay > self.max_wait:
+                raise RateLimitExceeded(
+                    "The %s rate limit will not be reset for %d seconds."
+                    % (self.name, delay))
+            logger.info("Waiting %.1f s for %s rate limit"
+                        % (delay, self.name))
+            time.sleep(delay)
+
+    def update(self, headers):
+        r"""Update the budget from the headers of a response.
+
+        Args:
+            headers (dict): Response headers.
+
+        """
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        resource = headers.get('x-ratelimit-resource', None)
+        if (self.resource is not None) and (resource is not None) and (
+                resource != self.resource):
+            return
+        with self.lock:
+            try:
+                if 'x-ratelimit-remaining' in headers:
+                    self.remaining = int(headers['x-ratelimit-remaining'])
+                if 'x-ratelimit-limit' in headers:
+                    self.limit = int(headers['x-ratelimit-limit'])
+                if 'x-ratelimit-reset' in headers:
+                    self.reset = float(headers['x-ratelimit-reset'])
+                if 'retry-after' in headers:
+                    self.blocked_until = max(
+                        self.blocked_until,
+                        time.time() + float(headers['retry-after']))
+            except ValueError:  # pragma: debug
+                logger.debug("Could not parse %s rate limit headers: %s"
+                             % (self.name, headers))
+
+    def retry_delay(self, attempt):
+        r"""Get the jittered exponential backoff before a retry.
+
+        Args:
+            attempt (int): Number of the retry (starting at 0).
+
+        Returns:
+            float: Time to wait in seconds.
+
+        """
+        return random.uniform(0.5, 1.0) * self.backoff * (2 ** attempt)
+
+    def call(self, func, is_limited, *args, **kwargs):
+        r"""Call a function that sends a request, waiting for the budget
+        before each attempt and retrying with backoff while the response
+        indicates that the rate limit was hit.
+
+        Args:
+            func (callable): Function sending the request.
+            is_limited (callable): Function that takes the result of func
+                and returns the response headers and whether the request
+                was rate limited.
+            *args: Additional arguments are passed to func.
+            **kwargs: Additional keyword arguments are passed to func.
+
+        Returns:
+            object: Result of the last call to func.
+
+        """
+        for attempt in range(self.max_retries + 1):
+            self.wait()
+            out = func(*args, **kwargs)
+            headers, limited = is_limited(out)
+            self.update(headers)
+            if (not limited) or (attempt == self.max_retries):
+                return out
+            delay = self.retry_delay(attempt)
+            logger.warning("Hit %s rate limit, retrying in %.1f s"
+                           % (self.name, delay))
+            with self.lock:
+                self.blocked_until = max(self.blocked_until,
+                                         time.time() + delay)
+        return out  # pragma: no cover
+
+
+def get_limiter(name, token, resource=None, **kwargs):
+    r"""Get the limiter for a set of credentials, creating it if one has not
+    been created yet.
+
+    Args:
+        name (str): Name of the service.
+        token (str): Authentication token.
+        resource (str, optional): Name of the rate limit resource for
+            services that keep a separate budget for different kinds of
+            requests. Defaults to None.
+        **kwargs: Additional keyword arguments are passed to RateLimiter if
+            it is created.
+
+    Returns:
+        RateLimiter: Limiter for the credentials.
+
+    """
+    with _registry_lock:
+        key = (name, token, resource)
+        if key not in _limiter_registry:
+            _limiter_registry[key] = RateLimiter(name, resource=resource,
+                                                 **kwargs)
+        return _limiter_registry[key]
+
+
+def add_read_tokens(name, token, tokens):
+    r"""Allow reads made by clients using a token to be spread across
+    additional tokens. Writes are always made with the original token so
+    that authorship is stable.
+
+    Args:
+        name (str): Name of the service.
+        token (str): Token used by the client and for all writes.
+        tokens (list): Additional tokens that may be used for reads.
+
+    """
+    with _registry_lock:
+        pool = _pool_registry.setdefault((name, token), [token])
+        for x in tokens:
+            if x and (x not in pool):
+                pool.append(x)
+
+
+def choose_read_token(name, token, resource=None):
+    r"""Select the token that a read should be made with, preferring the
+    token with the largest remaining budget.
+
+    Args:
+        name (str): Name of the service.
+        token (str): Token used by the client.
+        resource (str, optional): Name of the rate limit resource that the
+            read is charged to. Defaults to None.
+
+    Returns:
+        str: Token to use for the read.
+
+    """
+    with _registry_lock:
+        pool = list(_pool_registry.get((name, token), [token]))
+    if len(pool) == 1:
+        return token
+
+    def remaining(x):
+        out = get_limiter(name, x, resource=resource).budget()['remaining']
+        if out is None:  # Unused tokens are tried first
+            return float('inf')
+        return out
+
+    return max(pool, key=remaining)
+
+
+def _github_is_read(verb, url, input):
+    if verb in ('GET', 'HEAD'):
+        return True
+    if (verb == 'POST') and url.split('?')[0].endswith('/graphql'):
+        if isinstance(input, bytes):
+            input = input.decode('utf-8', 'replace')
+        return isinstance(input, str) and ('mutation' not in input)
+    return False
+
+
+def _github_resource(url):
+    path = url.split('?')[0]
+    if path.endswith('/graphql'):
+        return 'graphql'
+    if '/search/' in path:
+        return 'search'
+    return 'core'
+
+
+def _github_is_limited(result):
+    status, headers, output = result
+    if status not in (403, 429):
+        return headers, False
+    if status == 429 or ('retry-after' in headers):
+        return headers, True
+    if headers.get('x-ratelimit-remaining', None) == '0':
+        return headers, True
+    # Secondary rate limits are only identified by the message
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+    return headers, (isinstance(output, str)
+                     and ('secondary rate limit' in output.lower()))
+
+
+def wrap_github(requester, token):
+    r"""Route the requests made by a PyGithub requester through the limiter
+    for its token and the rate limit resource (core, graphql or search) that
+    the request is charged to. Reads are made with the token from the
+    token's pool (see add_read_tokens) with the largest remaining budget.
+
+    Args:
+        requester (github.Requester.Requester): Requester shared by the
+            objects created from a Github client.
+        token (str): Token used by the client.
+
+    """
+    raw = requester._Requester__requestRaw
+    if getattr(raw, 'limiter', None) is not None:
+        return
+
+    def request_raw(cnx, verb, url, headers, input, *args, **kwargs):
+        resource = _github_resource(url)
+        use = token
+        if (token is not None) and _github_is_read(verb, url, input):
+            use = choose_read_token('github', token, resource=resource)
+        if use != token:
+            headers = dict(headers, Authorization='token %s' % use)
+        out = get_limiter('github', use, resource=resource).call(
+            raw, _github_is_limited, cnx, verb, url, headers, input,
+            *args, **kwargs)
+        # Budgets are updated for the resource reported by the response in
+        # case it differs from the one expected from the URL
+        reported = {k.lower(): v for k, v in out[1].items()}.get(
+            'x-ratelimit-resource', resource)
+        if reported != resource:
+            get_limiter('github', use, resource=reported).update(out[1])
+        return out
+
+    request_raw.limiter = get_limiter('github', token, resource='core')
+    requester._Requester__requestRaw = request_raw
+
+
+def _smartsheet_is_limited(result):
+    resp = getattr(result, 'resp', None)
+    if resp is None:
+        return {}, False
+    return resp.headers, (resp.status_code == 429)
+
+
+def wrap_smartsheet(smart, limiter):
+    r"""Route the requests made by a Smartsheet client through a limiter.
+
+    Args:
+        smart (smartsheet.Smartsheet): Smartsheet client.
+        limiter (RateLimiter): Limiter for the client's credentials.
+
+    """
+    raw = smart._request
+    if getattr(raw, 'limiter', None) is not None:
+        return
+
+    def request(prepped_request, operation):
+        # The client redacts the token in requests once they are sent, so
+        # each attempt sends a copy
+        return limiter.call(
+            lambda: raw(prepped_request.copy(), operation),
+            _smartsheet_is_limited)
+
+    request.limiter = limiter
+    smart._request = request
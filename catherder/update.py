@@ -1,15 +1,179 @@
+import sys
+import time
 import logging
 import argparse
-from catherder import classes, config
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from catherder import cache, classes, config, httpcache, utils
 from catherder.fix_path import fix_paths
-logFormatter = logging.Formatter("[%(levelname)-8s] %(message)s")
+
+
+class ProjectLogFilter(logging.Filter):
+    r"""Logging filter that adds a prefix with the name of the project being
+    synced by the current thread to log records."""
+
+    def filter(self, record):
+        project = utils.get_log_project()
+        if project:
+            record.project_prefix = '[%s] ' % project
+        else:
+            record.project_prefix = ''
+        return True
+
+
+logFormatter = logging.Formatter(
+    "[%(levelname)-8s] %(project_prefix)s%(message)s")
 logger = logging.getLogger('catherder')
 logger.setLevel(logging.INFO)
 consoleHandler = logging.StreamHandler()
 consoleHandler.setFormatter(logFormatter)
+consoleHandler.addFilter(ProjectLogFilter())
 logger.addHandler(consoleHandler)
 
 
+def set_log_project(project):
+    r"""Set the project that log messages from the current thread should be
+    prefixed with (see utils.set_log_project). Threads started through
+    utils.run_tasks and utils.keep_log_project inherit the project.
+
+    Args:
+        project (str): Name of the project. If None, log messages will not
+            be prefixed.
+
+    """
+    utils.set_log_project(project)
+
+
+def prepare_api(cls, project, args, snapshot=False, log_project=None):
+    r"""Create an API instance for a project and, optionally, take a snapshot
+    of its remote data.
+
+    Args:
+        cls (type): UpdateAPI subclass that should be created.
+        project (str): Name of the project.
+        args (argparse.Namespace): Parsed command line arguments.
+        snapshot (bool, optional): If True, a snapshot of the remote data
+            will be taken so that it is ready for the next state update.
+            Defaults to False.
+        log_project (str, optional): Project that log messages should be
+            prefixed with. Defaults to None and messages are not prefixed.
+
+    Returns:
+        classes.UpdateAPI: API instance.
+
+    """
+    set_log_project(log_project)
+    out = cls(project_name=project, always_yes=args.yes, lazy=True)
+    if snapshot:
+        out.take_snapshot()
+    return out
+
+
+def sync_project(project, args, log_project=None):
+    r"""Perform the actions requested by the command line arguments for a
+    single project.
+
+    Args:
+        project (str): Name of the project.
+        args (argparse.Namespace): Parsed command line arguments.
+        log_project (str, optional): Project that log messages should be
+            prefixed with. Defaults to None and messages are not prefixed.
+
+    """
+    set_log_project(log_project)
+    # Only update the caches if no other actions were requested, the actions
+    # will update the state they require
+    update_caches = not (args.smartsheet or args.github or args.assignees
+                         or args.sort_project_cards or args.compact_cache)
+    snapshot = (update_caches or args.smartsheet or args.github
+                or args.assignees)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        f_sm = executor.submit(prepare_api, classes.SmartsheetAPI,
+                               project, args, snapshot=snapshot,
+                               log_project=log_project)
+        f_gh = executor.submit(prepare_api, classes.GithubAPI,
+                               project, args, snapshot=snapshot,
+                               log_project=log_project)
+        x_sm = f_sm.result()
+        x_gh = f_gh.result()
+    if args.fix_windows_paths:
+        for x in [x_sm, x_gh]:
+            fix_paths(x.config[x.name]['cache_dir'])
+    if args.compact_cache:
+        logger.info("Compacting cache history")
+        for x in [x_sm, x_gh]:
+            x.cache.compact()
+    if update_caches:
+        for x in [x_sm, x_gh]:
+            x.update_state()
+    if args.smartsheet:
+        logger.info("Updating Smartsheet from Github")
+        x_sm.update_remote(x_gh)
+    if args.github:
+        logger.info("Updating Github from Smartsheet")
+        x_gh.update_remote(
+            x_sm, suspend_progress_automation=(
+                not args.dont_suspend_automation))
+    if args.assignees:
+        logger.info("Updating Github assignees.")
+        x_gh.update_remote(x_sm)
+        # Don't update card column to in progress due to editting assignees
+        x_gh.update_remote(x_sm, update_assignees=True,
+                           suspend_progress_automation=True)
+    if args.sort_project_cards:
+        logger.info("Sorting Github project cards")
+        x_gh.sort_cards()
+
+
+def timed_sync_project(project, args):
+    r"""Sync a project, recording the outcome rather than raising errors.
+
+    Args:
+        project (str): Name of the project.
+        args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+        tuple: The project name, the outcome ('ok' or 'failed'), the time
+            taken in seconds, and the error message if the sync failed.
+
+    """
+    start = time.time()
+    try:
+        sync_project(project, args, log_project=project)
+        outcome, message = 'ok', ''
+    except Exception as e:
+        logger.exception("Failed to sync project '%s'" % project)
+        outcome, message = 'failed', str(e) or type(e).__name__
+    finally:
+        set_log_project(None)
+    return (project, outcome, time.time() - start, message)
+
+
+def sync_projects(projects, args):
+    r"""Sync multiple projects concurrently.
+
+    Args:
+        projects (list): Names of the projects that should be synced.
+        args (argparse.Namespace): Parsed command line arguments. The
+            number of projects synced at once is set by args.jobs.
+
+    Returns:
+        list: Outcomes for each project in the order provided (see
+            timed_sync_project).
+
+    """
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = OrderedDict([
+            (p, executor.submit(timed_sync_project, p, args))
+            for p in projects])
+        out = [f.result() for f in futures.values()]
+    logger.info("Summary:\n%s" % utils.format_table(
+        [(p, outcome, '%.1f' % t, message)
+         for p, outcome, t, message in out],
+        ['project', 'outcome', 'time (s)', 'error']))
+    return out
+
+
 def call_catherder():
     r"""Call catherder."""
     parser = argparse.ArgumentParser(
@@ -35,38 +199,45 @@ def call_catherder():
     parser.add_argument('--yes', '-y', action='store_true',
                         help=('Automatically answer yes to all questions '
                               'about updates.'))
+    parser.add_argument('--compact-cache', action='store_true',
+                        help=('Repack the cache history into base snapshots '
+                              'and deltas (see the cache_storage and '
+                              'cache_base_interval options).'))
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help=('Number of projects that should be synced '
+                              'concurrently. Values greater than 1 require '
+                              '--yes.'))
+    parser.add_argument('--no-http-cache', action='store_true',
+                        help=('Don\'t make requests conditional on the '
+                              'responses stored in the HTTP cache.'))
     args = parser.parse_args()
+    if args.no_http_cache:
+        httpcache.disable()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+    if (args.jobs > 1) and not args.yes:
+        parser.error("--jobs greater than 1 requires --yes as updates cannot "
+                     "be confirmed while projects are synced concurrently.")
     if not args.project:
-        if config.default_config.has_option('general', 'default_project'):
+        default_config = config.get_default_config()
+        if default_config.has_option('general', 'default_project'):
             args.project.append(
-                config.default_config['general']['default_project'])
+                default_config['general']['default_project'])
         else:
             config.initial_config()
+    # Read the config before the APIs are created in separate threads in
+    # case the user must be prompted for missing project information
     for project in args.project:
-        if args.configure:
-            config.read_project_config(project)
-        x_sm = classes.SmartsheetAPI(project_name=project, always_yes=args.yes)
-        x_gh = classes.GithubAPI(project_name=project, always_yes=args.yes)
-        if args.fix_windows_paths:
-            for x in [x_sm, x_gh]:
-                fix_paths(x.config[x.name]['cache_dir'])
-        if args.smartsheet:
-            logger.info("Updating Smartsheet from Github")
-            x_sm.update_remote(x_gh)
-        if args.github:
-            logger.info("Updating Github from Smartsheet")
-            x_gh.update_remote(
-                x_sm, suspend_progress_automation=(
-                    not args.dont_suspend_automation))
-        if args.assignees:
-            logger.info("Updating Github assignees.")
-            x_gh.update_remote(x_sm)
-            # Don't update card column to in progress due to editting assignees
-            x_gh.update_remote(x_sm, update_assignees=True,
-                               suspend_progress_automation=True)
-        if args.sort_project_cards:
-            logger.info("Sorting Github project cards")
-            x_gh.sort_cards()
+        config.read_project_config(project)
+    # Cache writes are published once at the end of the run
+    with cache.batch_writes():
+        if args.jobs > 1:
+            outcomes = sync_projects(args.project, args)
+        else:
+            for project in args.project:
+                sync_project(project, args)
+    if (args.jobs > 1) and any([x[1] != 'ok' for x in outcomes]):
+        sys.exit(1)
 
 
 if __name__ == '__main__':
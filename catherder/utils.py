@@ -1,102 +1,451 @@
+import io
 import os
+import csv
 import json
-import glob
-import tempfile
+import hashlib
 import pprint
 import difflib
 import logging
-from github.GithubException import UnknownObjectException
+import bisect
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from catherder import config
 logger = logging.getLogger(__name__)
+# Project that log messages from each thread are prefixed with
+_log_context = threading.local()
 
 
-def find_most_recent(fname_format, repo=None, return_tempfile=False):
-    r"""Find the most recent cache file.
+def content_hash(data, fname_format=None):
+    r"""Compute a hash of data that does not depend on formatting. JSON data
+    is hashed after being serialized with sorted keys and text data is
+    hashed after normalizing line endings.
 
     Args:
-        fname_format (str): Format string that should be used to locate
-            cache files.
-        repo (github.Repository.Repository, optional): Github repository
-            where the caches are stored. Defaults to None and local files
-            are checked (assuming that the files are local).
-        return_tempfile (bool, optional): If True and repo is provided, a
-            temporary file is created containing the contents of the most
-            recent cache in the repo (including files not contained in the
-            local repository) and the temporary file object is returned.
+        data (str, bytes, object): Path to a file, the raw contents of a
+            file, or parsed JSON data.
+        fname_format (str, optional): File name used to determine the file
+            type if data is not a path. Defaults to None and raw contents are
+            treated as text.
 
     Returns:
-        str, file: Full path to the cache or a file descriptor for the open
-            temporary file containing the file contents if return_tempfile is
-            True.
+        str: Hexadecimal SHA-256 digest.
 
     """
-    if repo is None:
-        fname_glob = fname_format.replace(
-            config.default_config['general']['time_format'], '*')
-        all_files = sorted(glob.glob(fname_glob))
-        if all_files:
-            return all_files[-1]
-    else:
-        try:
-            all_files = sorted(
-                repo.get_dir_contents(os.path.dirname(fname_format)),
-                key=lambda x: getattr(x, 'path'))
-            if all_files:
-                contents = all_files[-1].decoded_content
-                if return_tempfile:
-                    ext = os.path.splitext(fname_format)[-1]
-                    out = tempfile.NamedTemporaryFile(suffix=ext, mode='r+')
-                    out.write(contents.decode('utf-8'))
-                    out.seek(0)
-                    return out
-                elif fname_format.endswith('.json'):
-                    out = json.loads(contents)
-                else:
-                    out = contents
-                return out
-        except UnknownObjectException:
-            pass
+    if isinstance(data, config.str_types) and os.path.isfile(data):
+        fname_format = data
+        with open(data, 'rb') as fd:
+            data = fd.read()
+    if fname_format and fname_format.endswith('.json'):
+        if isinstance(data, config.str_types):
+            data = json.loads(data)
+        data = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    data = data.replace(b'\r\n', b'\n')
+    return hashlib.sha256(data).hexdigest()
+
+
+def git_blob_sha(contents):
+    r"""Compute the SHA git uses to identify a file with the provided
+    contents.
+
+    Args:
+        contents (bytes): File contents.
+
+    Returns:
+        str: Hexadecimal SHA-1 digest.
+
+    """
+    return hashlib.sha1(b'blob %d\0' % len(contents) + contents).hexdigest()
+
+
+def load_json(fname, default=None):
+    r"""Load JSON data from a file.
+
+    Args:
+        fname (str): Path to the file.
+        default (object, optional): Value that should be returned if the file
+            does not exist or cannot be parsed. Defaults to None.
+
+    Returns:
+        object: Data loaded from the file.
+
+    """
+    if not os.path.isfile(fname):
+        return default
+    try:
+        with open(fname, 'r') as fd:
+            return json.load(fd, object_pairs_hook=OrderedDict)
+    except ValueError:
+        logger.warning("Could not parse JSON file: %s" % fname)
+        return default
+
+
+def dump_json(fname, data):
+    r"""Write JSON data to a file, replacing any existing file only once the
+    data has been written completely.
+
+    Args:
+        fname (str): Path to the file.
+        data (object): JSON serializable data.
+
+    """
+    fname_tmp = '%s.%d.tmp' % (fname, os.getpid())
+    with open(fname_tmp, 'w') as fd:
+        json.dump(data, fd)
+    os.replace(fname_tmp, fname)
+
+
+class Diff(object):
+    r"""Field level differences between two data structures that are only
+    rendered as text when requested.
+
+    Args:
+        changes (list): Changes, each a tuple containing the path to the
+            changed value (a tuple of keys), the type of change ('added',
+            'removed', 'changed' or 'reordered'), the old value and the new
+            value.
+        nlines_context (int, optional): Number of lines before or after a
+            difference in multi-line strings that should be included when
+            the diff is rendered. Defaults to 5.
+
+    """
+
+    def __init__(self, changes, nlines_context=5):
+        self.changes = changes
+        self.nlines_context = nlines_context
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    __nonzero__ = __bool__
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __str__(self):
+        return self.render()
+
+    @classmethod
+    def format_path(cls, path):
+        r"""Format the path to a value.
+
+        Args:
+            path (tuple): Keys leading to the value.
+
+        Returns:
+            str: Formatted path.
+
+        """
+        if not path:
+            return '<root>'
+        return str(path[0]) + ''.join(['[%r]' % (x,) for x in path[1:]])
+
+    def render(self):
+        r"""Render the changes as text.
+
+        Returns:
+            str: Description of each change.
+
+        """
+        lines = []
+        for path, kind, old, new in self.changes:
+            name = self.format_path(path)
+            if kind == 'added':
+                lines.append('+ %s:\n%s' % (name, self.indent(new, '+ ')))
+            elif kind == 'removed':
+                lines.append('- %s:\n%s' % (name, self.indent(old, '- ')))
+            elif kind == 'reordered':
+                lines.append('~ %s: order changed' % name)
+            elif (isinstance(old, config.unicode_type)
+                  and isinstance(new, config.unicode_type)
+                  and (('\n' in old) or ('\n' in new))):
+                lines.append('~ %s:\n%s' % (name, ''.join(
+                    difflib.unified_diff(old.splitlines(True),
+                                         new.splitlines(True),
+                                         n=self.nlines_context))))
+            else:
+                lines.append('~ %s: %r -> %r' % (name, old, new))
+        return '\n'.join(lines)
+
+    @classmethod
+    def indent(cls, x, prefix):
+        r"""Pretty print a value with a prefix on every line.
+
+        Args:
+            x (object): Value to print.
+            prefix (str): Prefix to add to each line.
+
+        Returns:
+            str: Formatted value.
+
+        """
+        return '\n'.join([prefix + line for line in
+                          pprint.pformat(x).splitlines()])
+
+
+def _diff_key(a, b, keys):
+    # Return the first key that is present in all entries in both lists
+    if not (a or b):
+        return None
+    for k in keys:
+        if all([isinstance(x, dict) and (k in x) for x in a + b]):
+            return k
     return None
 
 
-def get_diff(a, b, nlines_context=5):
-    r"""Get difference between two objects by comparing their pprint strings.
+def _keyed_entries(x, key):
+    # Map from (key value, occurrence) to entry to allow duplicate keys
+    out = OrderedDict()
+    count = {}
+    for v in x:
+        count[v[key]] = count.get(v[key], -1) + 1
+        out[(v[key], count[v[key]])] = v
+    return out
+
+
+def _diff_values(a, b, path, keys, changes):
+    # Add changes between two values to changes
+    if isinstance(a, dict) and isinstance(b, dict):
+        for k in a:
+            if k not in b:
+                changes.append((path + (k,), 'removed', a[k], None))
+            else:
+                _diff_values(a[k], b[k], path + (k,), keys, changes)
+        for k in b:
+            if k not in a:
+                changes.append((path + (k,), 'added', None, b[k]))
+    elif isinstance(a, list) and isinstance(b, list):
+        key = _diff_key(a, b, keys)
+        if key is None:
+            if a != b:
+                _diff_sequences(a, b, path, changes)
+            return
+        map_a = _keyed_entries(a, key)
+        map_b = _keyed_entries(b, key)
+        for k, v in map_a.items():
+            name = k[0] if k[1] == 0 else k
+            if k not in map_b:
+                changes.append((path + (name,), 'removed', v, None))
+            else:
+                _diff_values(v, map_b[k], path + (name,), keys, changes)
+        for k, v in map_b.items():
+            if k not in map_a:
+                name = k[0] if k[1] == 0 else k
+                changes.append((path + (name,), 'added', None, v))
+        common_a = [k for k in map_a if k in map_b]
+        common_b = [k for k in map_b if k in map_a]
+        if common_a != common_b:
+            changes.append((path, 'reordered', common_a, common_b))
+    elif a != b:
+        changes.append((path, 'changed', a, b))
+
+
+def _diff_sequences(a, b, path, changes):
+    # Add changes between two lists without keys to changes, lines of text
+    # are joined so that they are rendered as a unified diff
+    if (a + b) and all([isinstance(x, bytes) for x in a + b]):
+        a = [x.decode('utf-8') for x in a]
+        b = [x.decode('utf-8') for x in b]
+    if ((all([isinstance(x, config.unicode_type) for x in a + b])
+         and any([x.endswith('\n') for x in a + b]))):
+        changes.append((path, 'changed', ''.join(a), ''.join(b)))
+    else:
+        changes.append((path, 'changed', a, b))
+
+
+def load_snapshot(contents, fname_format=None):
+    r"""Parse the contents of a snapshot.
 
     Args:
-        a (obj): First object for comparison.
-        b (obj): Second object for comparison.
+        contents (str, bytes): Raw contents of the snapshot.
+        fname_format (str, optional): File name used to determine the file
+            type. Defaults to None and the contents are split into lines.
+
+    Returns:
+        object: Parsed JSON data, the rows of a CSV file as dictionaries, or
+            the lines of other files.
+
+    """
+    if isinstance(contents, bytes):
+        contents = contents.decode('utf-8-sig')
+    if fname_format and fname_format.endswith('.json'):
+        return json.loads(contents)
+    elif fname_format and fname_format.endswith('.csv'):
+        return [row for row in csv.DictReader(io.StringIO(contents,
+                                                          newline=''))]
+    return contents.splitlines(True)
+
+
+def _load_diff_input(x):
+    # Load data from a file if x is a path
+    if isinstance(x, config.str_types):
+        if os.path.isfile(x):
+            with open(x, 'rb') as fd:
+                return load_snapshot(fd.read(), x)
+        return x.splitlines(True)
+    return x
+
+
+def get_diff(a, b, nlines_context=5, keys=('title', 'Task Name')):
+    r"""Get the field level differences between two objects. Lists of
+    dictionaries are matched by the first key in keys that all of the
+    dictionaries contain so that changes are reported for the matching
+    entries rather than for their positions.
+
+    Args:
+        a (obj): First object for comparison. If a path to a JSON or CSV file,
+            the data is loaded from the file. Raw file contents should be
+            parsed with load_snapshot first.
+        b (obj): Second object for comparison. If a path to a JSON or CSV
+            file, the data is loaded from the file.
         nlines_context (int, optional): Number of lines before or after a
-            difference that should be included in returned diff. Defaults to 5.
+            difference in multi-line strings that should be included when the
+            diff is rendered. Defaults to 5.
+        keys (tuple, optional): Keys that should be used to match
+            dictionaries in lists. Defaults to ('title', 'Task Name').
 
     Returns:
-        str, bool: If there are not any differences between the two objects,
-            False is returned. If there are differences, the diff is returned
-            as a string.
+        Diff: Differences between the two objects. The Diff evaluates to False
+            if there are not any differences and is converted to text when
+            formatted as a string.
 
     """
-    if isinstance(a, config.str_types):
-        if os.path.isfile(a):
-            with open(a, 'rb') as fd:
-                if a.endswith('.json'):
-                    a = json.load(fd)
-                else:
-                    a = fd.read().splitlines(True)
-        else:
-            a = a.splitlines(True)
-    str_a = pprint.pformat(a).splitlines(True)
-    if isinstance(b, config.str_types):
-        if os.path.isfile(b):
-            with open(b, 'rb') as fd:
-                if b.endswith('.json'):
-                    b = json.load(fd)
-                else:
-                    b = fd.read().splitlines(True)
+    changes = []
+    _diff_values(_load_diff_input(a), _load_diff_input(b), (), keys,
+                 changes)
+    return Diff(changes, nlines_context=nlines_context)
+
+
+def set_log_project(project):
+    r"""Set the project that log messages from the current thread should be
+    prefixed with.
+
+    Args:
+        project (str): Name of the project. If None, log messages will not
+            be prefixed.
+
+    """
+    _log_context.project = project
+
+
+def get_log_project():
+    r"""str: Project that log messages from the current thread are prefixed
+    with, None if they are not prefixed."""
+    return getattr(_log_context, 'project', None)
+
+
+def keep_log_project(func):
+    r"""Wrap a function that will be run by a worker thread so that its log
+    messages are prefixed with the project of the thread creating the
+    wrapper.
+
+    Args:
+        func (callable): Function to wrap.
+
+    Returns:
+        callable: Wrapped function.
+
+    """
+    project = get_log_project()
+
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        previous = get_log_project()
+        set_log_project(project)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            set_log_project(previous)
+
+    return wrapped
+
+
+def run_tasks(tasks, max_workers=1):
+    r"""Run independent tasks concurrently, recording the outcome of each
+    rather than stopping at the first error.
+
+    Args:
+        tasks (list): Pairs of a label (tuple of values describing the task)
+            and a function that takes no arguments.
+        max_workers (int, optional): Maximum number of tasks that are run
+            at once. Defaults to 1.
+
+    Returns:
+        list: For each task in the order provided, the label values followed
+            by the outcome ('ok' or 'failed') and the error message (empty
+            if the task succeeded).
+
+    """
+    def run(task):
+        label, func = task
+        try:
+            func()
+        except Exception as e:
+            logger.error("%s failed: %s" % (' '.join([str(x) for x in label]),
+                                              e))
+            return tuple(label) + ('failed', str(e))
+        return tuple(label) + ('ok', '')
+
+    if not tasks:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers,
+                                                   len(tasks)))) as executor:
+        return list(executor.map(keep_log_project(run), tasks))
+
+
+def format_table(rows, headers):
+    r"""Format rows of values as a plain text table.
+
+    Args:
+        rows (list): Rows in the table. Each row should be a list of values
+            in the same order as headers.
+        headers (list): Column headers.
+
+    Returns:
+        str: Table with columns padded to the width of the longest entry.
+
+    """
+    columns = [[str(h)] + [str(r[i]) for r in rows]
+               for i, h in enumerate(headers)]
+    widths = [max([len(x) for x in c]) for c in columns]
+    fmt = '  '.join(['%%-%ds' % w for w in widths])
+    lines = [fmt % tuple(headers), fmt % tuple(['-' * w for w in widths])]
+    for r in rows:
+        lines.append(fmt % tuple([str(x) for x in r]))
+    return '\n'.join([x.rstrip() for x in lines])
+
+
+def longest_increasing_subsequence(x):
+    r"""Find the longest strictly increasing subsequence of a sequence.
+
+    Args:
+        x (list): Sequence of comparable values.
+
+    Returns:
+        list: Values in the longest increasing subsequence in the order they
+            appear in x.
+
+    """
+    # Smallest tail value (and its index) for each subsequence length
+    tail_values = []
+    tails = []
+    prev = [None] * len(x)
+    for i, v in enumerate(x):
+        pos = bisect.bisect_left(tail_values, v)
+        if pos > 0:
+            prev[i] = tails[pos - 1]
+        if pos == len(tails):
+            tails.append(i)
+            tail_values.append(v)
         else:
-            b = b.splitlines(True)
-    str_b = pprint.pformat(b).splitlines(True)
-    diff = list(difflib.unified_diff(str_a, str_b))
-    # diff = list(difflib.ndiff(str_a, str_b))
-    if not any([x.startswith(('-', '+', '?')) for x in diff]):
-        return False
-    # return pprint.pformat(diff)
-    return ''.join(diff)
+            tails[pos] = i
+            tail_values[pos] = v
+    out = []
+    i = tails[-1] if tails else None
+    while i is not None:
+        out.append(x[i])
+        i = prev[i]
+    return out[::-1]
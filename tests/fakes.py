@@ -0,0 +1,5 @@
+class FakeObject(object):
+    r"""Object with the provided attributes."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
@@ -0,0 +1,161 @@
+import json
+from collections import OrderedDict
+from catherder import cache, utils
+from fakes import FakeObject
+
+
+class MemoryCacheStore(cache.CacheStore):
+    r"""Cache store that keeps files in memory."""
+
+    def __init__(self, *args, **kwargs):
+        self.files = OrderedDict()
+        super(MemoryCacheStore, self).__init__(None, *args, **kwargs)
+
+    def _list_files(self):
+        return [cache.CacheEntry(k, utils.git_blob_sha(v))
+                for k, v in self.files.items()]
+
+    def _read_file(self, path):
+        return self.files[path]
+
+    def _write_file(self, path, contents, message):
+        assert(path not in self.files)
+        self.files[path] = contents
+
+    def _update_file(self, entry, contents, message):
+        self.files[entry.path] = contents
+
+    def _delete_file(self, entry, message):
+        del self.files[entry.path]
+
+
+class FakeRepo(object):
+    r"""Stand in for the parts of a Github repository used by the Git Data
+    API batch."""
+
+    full_name = 'test/fake'
+    default_branch = 'main'
+
+    def __init__(self):
+        self.trees = []
+        self.ref = FakeObject(object=FakeObject(sha='head'),
+                              edit=lambda sha: None)
+
+    def get_dir_contents(self, directory):
+        return [FakeObject(path=directory + '/old.json', sha='abc')]
+
+    def get_git_ref(self, ref):
+        return self.ref
+
+    def get_git_commit(self, sha):
+        return FakeObject(sha=sha, tree=None)
+
+    def create_git_tree(self, elements, base_tree):
+        self.trees.append([x._identity for x in elements])
+        return None
+
+    def create_git_commit(self, message, tree, parents):
+        return self.get_git_commit('new')
+
+
+def make_snapshot(i):
+    r"""Create a JSON snapshot that changes a little with i."""
+    issues = [{'title': 'Issue %d' % j, 'body': 'Body %d' % j,
+               'state': 'open'} for j in range(20)]
+    issues[i]['state'] = 'closed'
+    return json.dumps({'milestones': [], 'issues': issues}).encode('utf-8')
+
+
+def test_delta_roundtrip():
+    r"""Test that deltas rebuild snapshots exactly."""
+    for ext, base, new in [
+            ('.json', make_snapshot(1), make_snapshot(2)),
+            ('.csv', b'a,b\r\n1,2\r\n3,4\r\n',
+             b'a,b\r\n1,2\r\n5,6\r\n7,8\r\n')]:
+        delta = cache.make_delta(base, new, ext)
+        assert(cache.apply_delta(base, json.loads(json.dumps(delta)),
+                                 ext) == new)
+
+
+def test_delta_storage():
+    r"""Test writing snapshots as deltas and compacting full history."""
+    fmt = '.cache_github/github_issues-%Y.json'
+    x = MemoryCacheStore(fmt, storage='full', base_interval=3)
+    snapshots = OrderedDict()
+    for i in range(7):
+        path = '.cache_github/github_issues-%04d.json' % i
+        snapshots[path] = make_snapshot(i + 1)
+        x.write(path, snapshots[path], 'test')
+    assert(not any([x.is_delta(k) for k in x.files]))
+    x.storage = 'delta'
+    assert(x.compact() == 4)
+    assert([x.is_delta(e.path) for e in x.list_entries()]
+           == [False, True, True, False, True, True, False])
+    for e, contents in zip(x.list_entries(), snapshots.values()):
+        assert(x.read(e) == contents)
+    # New snapshots are deltas against the latest base
+    entry = x.write('.cache_github/github_issues-0007.json',
+                    make_snapshot(8), 'test')
+    assert(x.is_delta(entry.path))
+    assert(x.read(x.latest_entry()) == make_snapshot(8))
+    assert(entry.sha == x.latest_entry().sha)
+
+
+def test_batch_commit():
+    r"""Test that writes from several stores are committed together."""
+    repo = FakeRepo()
+    x = cache.CacheStore(repo, '.cache_github/github_issues-%Y.json')
+    y = cache.CacheStore(repo, '.cache_smartsheet/milestones-%Y.csv')
+    assert(x.batch is y.batch)
+    with cache.batch_writes():
+        x.write('.cache_github/new.json', make_snapshot(1), 'github')
+        y.write('.cache_smartsheet/new.csv', b'a,b\n', 'smartsheet')
+        assert([e.path for e in x.list_entries()]
+               == ['.cache_github/new.json', '.cache_github/old.json'])
+        assert(x.read('.cache_github/new.json') == make_snapshot(1))
+        x._delete_file(cache.CacheEntry('.cache_github/old.json', 'abc'),
+                       'rm')
+        assert(len(repo.trees) == 0)
+    assert(len(repo.trees) == 1)
+    assert([e['path'] for e in repo.trees[0]]
+           == ['.cache_github/new.json', '.cache_smartsheet/new.csv',
+               '.cache_github/old.json'])
+    assert(repo.trees[0][-1]['sha'] is None)
+    assert(len(x.batch) == 0)
+    # Writes are committed immediately outside of batch_writes
+    x.write('.cache_github/other.json', make_snapshot(2), 'github')
+    assert(len(repo.trees) == 2)
+    assert(len(x.batch) == 0)
+    cache._batch_registry.clear()
+
+
+def test_local_clone(tmpdir):
+    r"""Test storing snapshots in a local clone of a bare repository."""
+    remote = str(tmpdir.join('remote.git'))
+    clone = cache.LocalClone(remote, str(tmpdir.join('clone')))
+    clone.git('init', '--quiet', '--bare', remote, cwd=None)
+    fmt = '.cache_github/github_issues-%Y.json'
+    x = cache.LocalCloneCacheStore(clone, fmt)
+    assert(x.list_entries() == [])
+    for i in range(2):
+        path = '.cache_github/github_issues-%04d.json' % i
+        entry = x.write(path, make_snapshot(i), 'test')
+        assert(entry == x.latest_entry())
+    x.flush()
+    # A second clone sees the pushed snapshots
+    other = cache.LocalCloneCacheStore(
+        cache.LocalClone(remote, str(tmpdir.join('other'))), fmt)
+    assert(other.list_entries() == x.list_entries())
+    assert(other.read(other.latest_entry()) == make_snapshot(1))
+    other.write('.cache_github/github_issues-0002.json', make_snapshot(2),
+                'test')
+    other.flush()
+    # Commits are rebased onto changes pushed from elsewhere
+    x.write('.cache_github/github_issues-0003.json', make_snapshot(3),
+            'test')
+    x.flush()
+    assert(len(x.list_entries()) == 4)
+    # Tokens are passed to git through the environment
+    header = cache.LocalClone(remote, str(tmpdir), token='secret').git(
+        'config', '--get', 'http.extraheader')
+    assert(header.startswith('AUTHORIZATION: basic '))
@@ -0,0 +1,346 @@
+import os
+import logging
+import datetime
+import configparser
+from catherder import cache, classes, config
+from fakes import FakeObject
+
+
+class FakeList(list):
+    r"""List with the total count reported by paginated lists."""
+
+    @property
+    def totalCount(self):
+        return len(self)
+
+
+class FakeRepo(object):
+    r"""Stand in for the parts of a Github repository used to take
+    snapshots. Issues are listed in an arbitrary order and only those in
+    updated are returned when since is provided."""
+
+    def __init__(self, issues):
+        self.issues = issues
+        self.updated = set()
+
+    def get_milestones(self, state='all'):
+        return []
+
+    def get_issues(self, state='all', since=None):
+        out = sorted(self.issues.values(), key=lambda x: x.title)
+        if since is not None:
+            out = [x for x in out if x.number in self.updated]
+        return FakeList(out)
+
+
+def make_api(cls, tmpdir, monkeypatch, remote_data):
+    r"""Create an API instance without config files or credentials."""
+    monkeypatch.setattr(config, 'project_dir', str(tmpdir))
+    x = object.__new__(cls)
+    x.project_name = 'test'
+    x.config = configparser.ConfigParser(interpolation=None)
+    x.config.read_dict({
+        'general': {'time_format': '%Y-%m-%d-%H-%M-%S'},
+        cls.name: {'incremental_snapshot': 'True',
+                   'full_resync_days': '7'}})
+    x.logger = logging.getLogger(__name__)
+    x.remote_address = 'owner/repo'
+    x._remote_data = remote_data
+    os.mkdir(x.project_dir)
+    return x
+
+
+def make_issue(number, title, created):
+    return FakeObject(number=number, title=title, body='body\r\n',
+                      milestone=None, assignees=[], state='open',
+                      created_at=datetime.datetime(2020, 1, created))
+
+
+def test_github_incremental(tmpdir, monkeypatch):
+    r"""Test that incremental Github snapshots match full snapshots."""
+    repo = FakeRepo({i: make_issue(i, 'Issue %d' % (4 - i), i)
+                     for i in range(1, 4)})
+    x = make_api(classes.GithubAPI, tmpdir, monkeypatch, repo)
+    column = FakeObject(name='To do')
+    x._issue2card = {i: FakeObject() for i in range(1, 5)}
+    x._issue2column = {i: column for i in range(1, 5)}
+
+    def snapshot(incremental):
+        if not incremental:
+            os.remove(x.snapshot_index_file)
+        fname = str(tmpdir.join('snapshot.json'))
+        x.download_remote(fname)
+        with open(fname, 'r') as fd:
+            return fd.read()
+
+    full = snapshot(True)
+    # Updated and new issues are merged into the last snapshot
+    repo.issues[2].title = 'Updated'
+    repo.issues[4] = make_issue(4, 'Issue 0', 4)
+    repo.updated = {2, 4}
+    incremental = snapshot(True)
+    assert(incremental != full)
+    assert(incremental == snapshot(False))
+    # Deleted issues cause a full snapshot
+    del repo.issues[3]
+    repo.updated = set()
+    incremental = snapshot(True)
+    assert('Issue 1' not in incremental)
+    assert(incremental == snapshot(False))
+
+
+def test_graphql2local():
+    r"""Test converting GraphQL nodes into the same structure as the REST
+    API."""
+    node = {'number': 3, 'createdAt': '2020-01-31T08:00:00Z',
+            'title': 'Issue', 'body': 'a\r\nb', 'state': 'MERGED',
+            'milestone': {'title': 'Milestone'},
+            'assignees': {'nodes': [{'login': 'user'}]},
+            'projectCards': {'nodes': [
+                {'project': {'name': 'Other'}, 'column': {'name': 'To do'}},
+                {'project': {'name': 'Grant'}, 'column': {'name': 'Done'}}]}}
+    assert(classes.GithubAPI.graphql2index_issue(node, 'Grant') == {
+        'number': 3, 'created_at': '2020-01-31T08:00:00',
+        'data': {'title': 'Issue', 'body': 'a\nb', 'milestone': 'Milestone',
+                 'assignees': ['user'], 'state': 'closed',
+                 'column': 'Done'}})
+    node = {'title': 'Milestone', 'description': None, 'state': 'OPEN',
+            'dueOn': '2020-01-31T08:00:00Z'}
+    assert(classes.GithubAPI.graphql2local_milestone(node) == {
+        'title': 'Milestone', 'description': None, 'state': 'open',
+        'due_on': '01/31/20'})
+
+
+def test_sort_cards(tmpdir, monkeypatch):
+    r"""Test that only cards outside of the longest sorted run are moved."""
+    x = make_api(classes.GithubAPI, tmpdir, monkeypatch, None)
+    x._github_project_map = None
+    monkeypatch.setattr(classes.GithubAPI, 'rate_limiter',
+                        FakeObject(check_budget=lambda *args: None))
+    titles = {1: 'Issue 1A1: a', 2: 'Issue 1A2: b', 3: 'Issue 1B1: c',
+              4: 'Issue 2A1: d'}
+
+    def make_card(number):
+        return FakeObject(id=number * 10, note=None, archived=False,
+                          content_url='https://api/issues/%d' % number)
+
+    columns = {'Sorted': [make_card(i) for i in [1, 2, 3, 4]],
+               'Unsorted': [make_card(i) for i in [1, 4, 2, 3]]}
+    x.get_column = lambda name: FakeObject(
+        name=name, get_cards=lambda: columns[name])
+    moves = []
+    x.edit_card = lambda card, position=None: moves.append(
+        (card.id, position))
+    assert(x.sort_cards(['Sorted', 'Unsorted'], titles=titles) == 1)
+    assert(moves == [(40, 'after:30')])
+
+
+class FakeSheets(object):
+    r"""Stand in for the parts of the Smartsheet sheets API used to take
+    snapshots. Only rows in modified are returned when rows_modified_since
+    is provided."""
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.modified = set()
+
+    def get_sheet_version(self, sheet_id):
+        return FakeObject(version=self.sheet.version)
+
+    def get_sheet(self, sheet_id, rows_modified_since=None,
+                  column_ids=None, row_ids=None):
+        rows = self.sheet.rows
+        if rows_modified_since is not None:
+            rows = [x for x in rows if x.id in self.modified]
+        if row_ids is not None:
+            rows = [x for x in rows if x.id in row_ids]
+        return FakeObject(id=self.sheet.id, version=self.sheet.version,
+                          columns=self.sheet.columns,
+                          total_row_count=len(self.sheet.rows), rows=rows)
+
+
+def make_row(id, parent_id, title):
+    return FakeObject(id=id, parent_id=parent_id, cells=[
+        FakeObject(column_id=1, value=title, display_value=None)])
+
+
+def test_smartsheet_incremental(tmpdir, monkeypatch):
+    r"""Test that incremental Smartsheet snapshots match full snapshots."""
+    sheet = FakeObject(id=1, version=1,
+                       columns=[FakeObject(id=1, title='Task Name')],
+                       rows=[make_row(1, None, 'Goal 1'),
+                             make_row(2, 1, 'Supporting objective A'),
+                             make_row(3, 2, 'M1'),
+                             make_row(4, 1, 'Supporting objective B'),
+                             make_row(5, 4, 'M2')])
+    x = make_api(classes.SmartsheetAPI, tmpdir, monkeypatch, sheet)
+    x._api = FakeObject(Sheets=FakeSheets(sheet))
+
+    def snapshot(incremental):
+        if not incremental:
+            os.remove(x.snapshot_index_file)
+        fname = str(tmpdir.join('snapshot.csv'))
+        x.download_remote(fname)
+        with open(fname, 'r') as fd:
+            return fd.read()
+
+    full = snapshot(True)
+    assert(snapshot(True) == full)
+    # Modified rows are patched into the last snapshot
+    sheet.version += 1
+    sheet.rows[2].cells[0].value = 'M1 updated'
+    x._api.Sheets.modified = {3}
+    incremental = snapshot(True)
+    assert('M1 updated' in incremental)
+    assert(incremental == snapshot(False))
+    # Parents that roll up values from a modified child are updated
+    sheet.version += 1
+    sheet.rows[2].cells[0].value = 'M1 done'
+    sheet.rows[1].cells[0].value = 'Supporting objective A (done)'
+    x._api.Sheets.modified = {3}
+    incremental = snapshot(True)
+    assert('Supporting objective A (done)' in incremental)
+    assert(incremental == snapshot(False))
+    # Moving a row changes the order without modifying other rows
+    sheet.version += 1
+    row = sheet.rows.pop(2)
+    row.parent_id = 4
+    sheet.rows.append(row)
+    x._api.Sheets.modified = set()
+    incremental = snapshot(True)
+    assert(incremental.splitlines()[-1] == 'M1 done')
+    assert(incremental == snapshot(False))
+
+
+class FakeUploadSheets(object):
+    r"""Stand in for the parts of the Smartsheet sheets API used to upload
+    rows. New rows are given ids and returned and rows in reject (pairs of
+    parent id and title) are reported as failed."""
+
+    def __init__(self, reject):
+        self.reject = reject
+        self.added = []
+
+    def send(self, rows, add=False):
+        data = []
+        failed = []
+        for i, row in enumerate(rows):
+            title = row.get_column(1).value if add else None
+            if (row.parent_id, title) in self.reject:
+                failed.append(FakeObject(index=i, row_id=row.id,
+                                         error=FakeObject(message='Rejected')))
+                continue
+            if add:
+                row.id = 100 + len(self.added)
+                self.added.append((row.parent_id, title))
+                data.append(row)
+        return FakeObject(data=data, failed_items=failed)
+
+    def update_rows_with_partial_success(self, sheet_id, rows):
+        return self.send(rows)
+
+    def add_rows_with_partial_success(self, sheet_id, rows):
+        return self.send(rows, add=True)
+
+
+def test_smartsheet_upload(tmpdir, monkeypatch):
+    r"""Test uploading new objectives and milestones to Smartsheet."""
+    import smartsheet
+    sheet = smartsheet.models.Sheet({
+        'id': 1, 'version': 1,
+        'columns': [{'id': 1, 'title': 'Task Name'},
+                    {'id': 2, 'title': 'Status'}],
+        'rows': [
+            {'id': 1, 'cells': [{'columnId': 1, 'value': 'Goal 1: Test'}]},
+            {'id': 2, 'parentId': 1, 'cells': [
+                {'columnId': 1, 'value': 'Supporting objective 1A: Old'}]},
+            {'id': 3, 'parentId': 2, 'cells': [
+                {'columnId': 1, 'value': 'M1'}, {'columnId': 2}]}]})
+    x = make_api(classes.SmartsheetAPI, tmpdir, monkeypatch, sheet)
+    x._contacts = [FakeObject()]
+    monkeypatch.setattr(classes.SmartsheetAPI, 'rate_limiter',
+                        FakeObject(check_budget=lambda *args: None))
+    x._api = FakeObject(Sheets=FakeUploadSheets({(2, 'M2')}))
+    results = x.upload_remote({
+        'objectives': [{'Task Name': 'Supporting objective 1A: Old'},
+                       {'Task Name': 'Supporting objective 1B: New'},
+                       {'Task Name': 'Supporting objective 2A: No goal'},
+                       {'Task Name': 'Other milestone'}],
+        'milestones': [
+            {'Task Name': 'M1', 'Status': 'Complete'},
+            {'Task Name': 'M2',
+             'Supporting Objective': 'Supporting objective 1B'},
+            {'Task Name': 'M2',
+             'Supporting Objective': 'Supporting objective 1A'}]})
+    assert(results == [
+        ('objective', 'Supporting objective 2A: No goal', 'create',
+         'failed', 'No row for Goal 2'),
+        ('objective', 'Other milestone', 'create', 'skipped',
+         'Not a supporting objective'),
+        ('milestone', 'M1', 'update', 'ok', ''),
+        ('objective', 'Supporting objective 1B: New', 'create', 'ok', ''),
+        ('milestone', 'M2', 'create', 'ok', ''),
+        ('milestone', 'M2', 'create', 'failed', 'Rejected')])
+    # New milestones are added beneath the new objective
+    assert(x._api.Sheets.added == [(1, 'Supporting objective 1B: New'),
+                                   (100, 'M2')])
+
+
+def test_get_api_shared():
+    r"""Test that API objects are shared between calls using the same
+    token."""
+    x = classes.SmartsheetAPI.get_api('token1')
+    assert(classes.SmartsheetAPI.get_api('token1') is x)
+    assert(classes.SmartsheetAPI.get_api('token2') is not x)
+
+
+def test_sheet2csv(tmpdir):
+    r"""Test writing a CSV snapshot from the rows of a sheet."""
+    import smartsheet
+    titles = ['Task Name', 'Start', 'Finish', 'Done', 'Status', 'Duration',
+              'Predecessors']
+    types = {'Start': 'ABSTRACT_DATETIME', 'Finish': 'DATE',
+             'Done': 'CHECKBOX'}
+    sheet = smartsheet.models.Sheet({
+        'id': 1, 'version': 1,
+        'columns': [{'id': i, 'title': t, 'type': types.get(t, 'TEXT_NUMBER')}
+                    for i, t in enumerate(titles)],
+        'rows': [
+            {'id': 100, 'cells': [
+                {'columnId': 0, 'value': 'Supporting objective 1A: Test'}]},
+            {'id': 101, 'cells': [
+                {'columnId': 0, 'value': 'Milestone, "quoted"'},
+                # Dates are returned without a display value
+                {'columnId': 1, 'value': '2019-01-01T08:00:00'},
+                {'columnId': 2, 'value': '2019-01-02'},
+                {'columnId': 3, 'value': True}]}]})
+    fname = str(tmpdir.join('sheet.csv'))
+    classes.SmartsheetAPI.write_csv(
+        fname, titles, [classes.SmartsheetAPI.row2csv(row, sheet.columns)
+                        for row in sheet.rows])
+    out = classes.SmartsheetAPI.load_local(fname)
+    assert(len(out['objectives']) == 1)
+    assert(out['milestones'] == [
+        {'Task Name': 'Milestone, "quoted"', 'Start': '01/01/19',
+         'Finish': '01/02/19', 'Done': 'true', 'Status': '',
+         'Supporting Objective': 'Supporting objective 1A'}])
+
+
+def test_read_cache(tmpdir, monkeypatch):
+    r"""Test that a cache is only downloaded once to hash and diff it."""
+    reads = []
+
+    def read(entry):
+        reads.append(entry)
+        return b'{"issues": []}'
+
+    x = make_api(classes.GithubAPI, tmpdir, monkeypatch, None)
+    x.config['github']['cache_file'] = 'github_issues.json'
+    x._cache = FakeObject(read=read)
+    x._cache_contents = None
+    entry = cache.CacheEntry('github_issues.json', 'abc')
+    x.get_cache_hash(entry)
+    assert(x.read_cache(entry) == b'{"issues": []}')
+    assert(len(reads) == 1)
+    x.read_cache(cache.CacheEntry('github_issues.json', 'def'))
+    assert(len(reads) == 2)
@@ -0,0 +1,29 @@
+from catherder import directory
+
+
+def test_directory(tmpdir):
+    r"""Test looking up stored entries and refreshing them on a miss."""
+    people = [{'name': 'A', 'email': 'a@x.org'}]
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return list(people)
+
+    fname = str(tmpdir.join('directory', 'test.json'))
+    x = directory.Directory(fname, {'contacts': fetch})
+    assert(x.get('contacts', name='A') == people[0])
+    assert(x.get('contacts', email='A@X.org') == people[0])
+    assert(len(calls) == 1)
+    # Entries are reused from disk until they expire
+    y = directory.Directory(fname, {'contacts': fetch})
+    assert(y.entries('contacts') == people)
+    assert(len(calls) == 1)
+    # A miss refreshes the entries once
+    people.append({'name': 'B', 'email': 'b@x.org'})
+    assert(y.get('contacts', name='B') == people[1])
+    assert(y.get('contacts', name='C') is None)
+    assert(len(calls) == 2)
+    y.ttl = -1
+    y.entries('contacts')
+    assert(len(calls) == 3)
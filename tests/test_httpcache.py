@@ -0,0 +1,71 @@
+import threading
+import http.client
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from catherder import httpcache
+
+
+class Handler(BaseHTTPRequestHandler):
+    r"""Handler that answers conditional requests for the current body."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        etag = '"%d"' % server.version
+        if self.headers.get('If-None-Match', None) == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = ('version %d' % server.version).encode('utf-8')
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_conditional_requests(tmpdir):
+    r"""Test replaying stored responses when the server returns 304."""
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    server.version = 1
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        def send(url, headers):
+            cnx = http.client.HTTPConnection(*server.server_address)
+            cnx.request('GET', url, headers=headers)
+            resp = cnx.getresponse()
+            out = (resp.status, {k.lower(): v for k, v in resp.getheaders()},
+                   resp.read())
+            cnx.close()
+            return out
+
+        x = httpcache.HTTPCache(str(tmpdir.join('cache')))
+
+        def get(url, auth='token a'):
+            return x.request(url, auth, {},
+                             lambda h: send(url, h))
+
+        assert(get('/a')[2] == b'version 1')
+        assert('If-None-Match' not in server.requests[-1])
+        status, headers, body = get('/a')
+        assert((status, body) == (200, b'version 1'))
+        assert(server.requests[-1]['If-None-Match'] == '"1"')
+        # Responses are stored separately for each token
+        get('/a', auth='token b')
+        assert('If-None-Match' not in server.requests[-1])
+        server.version = 2
+        assert(get('/a')[2] == b'version 2')
+        # Least recently used responses are removed
+        x.max_size = x.size() - 1
+        get('/b')
+        assert(len(x.entries()) < 3)
+        assert(x.get('/b', 'token a') is not None)
+    finally:
+        server.shutdown()
+        server.server_close()
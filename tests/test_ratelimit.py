@@ -0,0 +1,117 @@
+import time
+import pytest
+from catherder import ratelimit
+
+
+def test_budget():
+    r"""Test tracking the budget reported by response headers."""
+    x = ratelimit.RateLimiter('test')
+    assert(x.budget()['remaining'] is None)
+    x.check_budget(1000)
+    reset = time.time() + 3600
+    x.update({'X-RateLimit-Remaining': '10', 'X-RateLimit-Limit': '5000',
+              'X-RateLimit-Reset': str(reset)})
+    assert(x.budget() == {'remaining': 10, 'limit': 5000, 'reset': reset})
+    x.check_budget(10)
+    with pytest.raises(ratelimit.RateLimitExceeded):
+        x.check_budget(11)
+    # The remaining requests are spread over the rest of the period
+    x.wait()
+    assert(x.budget()['remaining'] == 9)
+    assert(x.delay() > 0)
+
+
+def test_window():
+    r"""Test pacing requests for services that do not report a budget."""
+    x = ratelimit.RateLimiter('test', limit=2, window=60.0)
+    x.wait()
+    x.wait()
+    assert(x.budget()['remaining'] == 0)
+    assert(x.delay() > 59)
+
+
+def test_retry():
+    r"""Test retrying rate limited requests."""
+    x = ratelimit.RateLimiter('test', backoff=0.001)
+    # Responses are popped from the end
+    responses = [(200, {}, b''),
+                 (403, {}, b'You have exceeded a secondary rate limit'),
+                 (429, {'retry-after': '0'}, b'')]
+    out = x.call(responses.pop, ratelimit._github_is_limited)
+    assert(out[0] == 200)
+    responses = [(200, {}, b''), (403, {}, b'Forbidden')]
+    assert(x.call(responses.pop, ratelimit._github_is_limited)[0] == 403)
+    assert(len(responses) == 1)
+
+
+def test_read_tokens():
+    r"""Test spreading reads across a pool of tokens."""
+    assert(ratelimit.choose_read_token('pool', 'write') == 'write')
+    ratelimit.add_read_tokens('pool', 'write', ['read1', 'read2'])
+    reset = str(time.time() + 3600)
+    for token, remaining in [('write', '100'), ('read1', '4000'),
+                             ('read2', '10')]:
+        ratelimit.get_limiter('pool', token).update({
+            'X-RateLimit-Remaining': remaining, 'X-RateLimit-Reset': reset})
+    assert(ratelimit.choose_read_token('pool', 'write') == 'read1')
+    assert(ratelimit._github_is_read('GET', '/repos/a/b', None))
+    assert(ratelimit._github_is_read('POST', '/graphql', b'{"query": ""}'))
+    assert(not ratelimit._github_is_read('PATCH', '/projects/columns/cards/1',
+                                         None))
+
+
+def test_resources():
+    r"""Test that Github requests are charged to the budget for their
+    resource."""
+    reset = str(time.time() + 3600)
+    responses = {
+        '/repos/a/b': {'X-RateLimit-Resource': 'core',
+                       'X-RateLimit-Remaining': '4000'},
+        '/search/issues': {'X-RateLimit-Resource': 'search',
+                           'X-RateLimit-Remaining': '20'},
+        '/graphql': {'X-RateLimit-Resource': 'graphql',
+                     'X-RateLimit-Remaining': '100'}}
+
+    def raw(cnx, verb, url, headers, input):
+        return 200, dict(responses[url], **{'X-RateLimit-Reset': reset}), b''
+
+    requester = type('FakeRequester', (object, ), {})()
+    requester._Requester__requestRaw = raw
+    ratelimit.wrap_github(requester, 'resources')
+    for url in responses:
+        requester._Requester__requestRaw(None, 'GET', url, {}, None)
+    assert(requester._Requester__requestRaw.limiter.budget()['remaining']
+           == 4000)
+    for resource, remaining in [('search', 20), ('graphql', 100)]:
+        x = ratelimit.get_limiter('github', 'resources', resource=resource)
+        assert(x.budget()['remaining'] == remaining)
+    # Headers for a different resource do not change the budget
+    x.update({'X-RateLimit-Resource': 'core', 'X-RateLimit-Remaining': '1'})
+    assert(x.budget()['remaining'] == 100)
+
+
+def test_smartsheet_retry():
+    r"""Test that retried Smartsheet requests keep their token."""
+    import requests
+    sent = []
+    status = [200, 429]
+
+    class FakeResult(object):
+        def __init__(self, code):
+            self.resp = requests.models.Response()
+            self.resp.status_code = code
+
+    def raw(prepped_request, operation):
+        sent.append(prepped_request.headers['Authorization'])
+        # The client redacts the token once a request is sent
+        prepped_request.headers['Authorization'] = '[redacted]'
+        return FakeResult(status.pop())
+
+    smart = type('FakeSmartsheet', (object, ), {})()
+    smart._request = raw
+    ratelimit.wrap_smartsheet(
+        smart, ratelimit.RateLimiter('test', backoff=0.001))
+    req = requests.Request('GET', 'https://example.com', headers={
+        'Authorization': 'Bearer secret'}).prepare()
+    assert(smart._request(req, {}).resp.status_code == 200)
+    assert(sent == ['Bearer secret', 'Bearer secret'])
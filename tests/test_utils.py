@@ -1,4 +1,5 @@
-from catherder import classes
+import json
+from catherder import classes, utils
 
 
 def test_milestone2issue():
@@ -11,3 +12,79 @@ def test_milestone2issue():
         issue = x_gh.get_issue_from_Smartsheet_milestone(milestone0)
         milestone1 = x_sm.get_milestone_from_Github_issue(issue)
         assert(milestone0 == milestone1)
+
+
+def test_format_table():
+    r"""Test formatting rows as a table with padded columns."""
+    out = utils.format_table([('a', 'ok', '1.0'), ('project', 'failed', '')],
+                             ['project', 'outcome', 'time (s)'])
+    assert(out.splitlines() == [
+        'project  outcome  time (s)',
+        '-------  -------  --------',
+        'a        ok       1.0',
+        'project  failed'])
+
+
+def test_run_tasks():
+    r"""Test running tasks concurrently and reporting failures."""
+    def fail():
+        raise ValueError("error")
+    results = utils.run_tasks([(('a', ), lambda: None), (('b', ), fail)],
+                              max_workers=2)
+    assert(results == [('a', 'ok', ''), ('b', 'failed', 'error')])
+    # Workers log with the project of the thread submitting the tasks
+    projects = []
+    utils.set_log_project('x')
+    try:
+        utils.run_tasks([(('a', ), lambda: projects.append(
+            utils.get_log_project()))])
+    finally:
+        utils.set_log_project(None)
+    assert(projects == ['x'])
+
+
+def test_content_hash():
+    r"""Test that content hashes do not depend on formatting."""
+    assert(utils.content_hash('{"a": 1, "b": [1, 2]}', 'x.json')
+           == utils.content_hash({'b': [1, 2], 'a': 1}, 'x.json'))
+    assert(utils.content_hash(b'a,b\r\n1,2\r\n', 'x.csv')
+           == utils.content_hash('a,b\n1,2\n', 'x.csv'))
+    assert(utils.content_hash(b'a,b\n1,2\n', 'x.csv')
+           != utils.content_hash(b'a,b\n1,3\n', 'x.csv'))
+    assert(utils.git_blob_sha(b'hello\n')
+           == 'ce013625030ba8dba906f756967f9e9ca394464a')
+
+
+def test_get_diff():
+    r"""Test that differences are reported for entries matched by key."""
+    a = {'issues': [{'title': 'A', 'body': 'x\ny\n', 'assignees': ['u1']},
+                    {'title': 'B', 'body': '', 'assignees': []}]}
+    b = {'issues': [{'title': 'C', 'body': '', 'assignees': []},
+                    {'title': 'A', 'body': 'x\nz\n', 'assignees': ['u1']},
+                    {'title': 'B', 'body': '', 'assignees': ['u2']}]}
+    assert(not utils.get_diff(a, a))
+    diff = utils.get_diff(a, b)
+    assert([x[:2] for x in diff.changes] == [
+        (('issues', 'A', 'body'), 'changed'),
+        (('issues', 'B', 'assignees'), 'changed'),
+        (('issues', 'C'), 'added')])
+    text = str(diff)
+    assert('-y' in text)
+    assert('+z' in text)
+    b['issues'].reverse()
+    assert([x[1] for x in utils.get_diff(a, b).changes][-1] == 'reordered')
+    # Raw snapshot contents are parsed by file type
+    csv_a = utils.load_snapshot(b'Task Name,Status\r\nA,Done\r\n', 'x.csv')
+    assert(csv_a == [{'Task Name': 'A', 'Status': 'Done'}])
+    assert(not utils.get_diff(csv_a, utils.load_snapshot(
+        'Task Name,Status\nA,Done\n', 'x.csv')))
+    assert(not utils.get_diff(utils.load_snapshot(json.dumps(a), 'x.json'),
+                              a))
+
+
+def test_longest_increasing_subsequence():
+    r"""Test finding the cards that can stay in place while sorting."""
+    assert(utils.longest_increasing_subsequence([]) == [])
+    assert(utils.longest_increasing_subsequence([0, 1, 2]) == [0, 1, 2])
+    assert(utils.longest_increasing_subsequence([3, 0, 1, 4, 2, 5])
+           == [0, 1, 2, 5])